@@ -0,0 +1,89 @@
+import hashlib
+from sqlalchemy import Table
+from sqlalchemy.sql import visitors
+from bjs_sqlalchemy.models import signals
+from .backends import MemoryBackend, FileBackend
+from .encoding import encode, decode
+
+class ResultCache:
+    def __init__(self, backend=None, ttl=60):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        signals.connect(self.invalidate)
+
+    @staticmethod
+    def _statement(query):
+        return query.statement if hasattr(query, "statement") else query
+
+    @staticmethod
+    def tables(statement):
+        tables = set()
+        for element in visitors.iterate(statement):
+            table = element if isinstance(element, Table) else getattr(element, "table", None)
+            if isinstance(table, Table):
+                tables.add(table.name)
+        return sorted(tables)
+
+    @staticmethod
+    def loader_options(statement):
+        # selectinload / load_only and friends leave the SQL alone, the
+        # entry would otherwise be served without the relations they load
+        options = []
+        for option in statement._with_options:
+            for element in getattr(option, "context", ()):
+                path = tuple(
+                    (f"{cls.__module__}.{cls.__qualname__}", key)
+                    for cls, key in element.path.serialize()
+                )
+                options.append((path, element.strategy, sorted(element.local_opts.items())))
+            if not hasattr(option, "context"):
+                options.append(type(option).__name__)
+        return options
+
+    def key(self, query, *extra):
+        statement = self._statement(query)
+        compiled = statement.compile()
+        params = sorted(compiled.params.items())
+        signature = repr((str(compiled), params, self.loader_options(statement), extra))
+        return hashlib.sha1(signature.encode()).hexdigest(), self.tables(statement)
+
+    def get(self, key):
+        payload = self.backend.get(key)
+        if payload is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return decode(payload)
+
+    def set(self, key, data, tables=()):
+        # a write to an eager loaded table invalidates the entry as well
+        related = set()
+        payload = encode(data, related)
+        self.backend.set(key, payload, tables=sorted({*tables, *related}), ttl=self.ttl)
+
+    def fetch(self, query, loader, *extra):
+        key, tables = self.key(query, *extra)
+        data = self.get(key)
+        if data is None:
+            data = loader()
+            self.set(key, data, tables)
+        return data
+
+    async def async_fetch(self, query, loader, *extra):
+        key, tables = self.key(query, *extra)
+        data = self.get(key)
+        if data is None:
+            data = await loader()
+            self.set(key, data, tables)
+        return data
+
+    def invalidate(self, table):
+        self.backend.invalidate(table)
+
+    def clear(self):
+        self.backend.clear()
+
+    def close(self):
+        signals.disconnect(self.invalidate)
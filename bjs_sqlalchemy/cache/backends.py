@@ -0,0 +1,145 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+class MemoryBackend:
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+
+            expires, tables, payload = entry
+            if expires and expires < time.monotonic():
+                self._remove(key)
+                return None
+
+            self._data.move_to_end(key)
+            return payload
+
+    def set(self, key, payload, tables=(), ttl=None):
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._remove(key)
+            self._data[key] = (expires, tuple(tables), payload)
+            for table in tables:
+                self._tables.setdefault(table, set()).add(key)
+
+            while len(self._data) > self.max_entries:
+                self._remove(next(iter(self._data)))
+
+    def _remove(self, key):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        for table in entry[1]:
+            keys = self._tables.get(table)
+            if keys is not None:
+                keys.discard(key)
+
+    def invalidate(self, table):
+        with self._lock:
+            for key in list(self._tables.pop(table, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tables.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class FileBackend:
+    # A local SQLite file, shared by every process on the host
+    def __init__(self, path="cache.db", max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, expires REAL, accessed REAL, payload BLOB)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entry_tables ("
+                "table_name TEXT, key TEXT, PRIMARY KEY (table_name, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_accessed ON entries (accessed)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_entry_tables_key ON entry_tables (key)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _delete(self, conn, where, params):
+        keys = [(i[0],) for i in conn.execute(f"SELECT key FROM entries WHERE {where}", params)]
+        conn.executemany("DELETE FROM entry_tables WHERE key = ?", keys)
+        conn.executemany("DELETE FROM entries WHERE key = ?", keys)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT expires, payload FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            if row[0] and row[0] < now:
+                self._delete(conn, "key = ?", (key,))
+                return None
+
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            return row[1]
+
+    def set(self, key, payload, tables=(), ttl=None):
+        now = time.time()
+        expires = now + ttl if ttl else None
+        with self._lock, closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM entry_tables WHERE key = ?", (key,))
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, expires, accessed, payload) VALUES (?, ?, ?, ?)",
+                (key, expires, now, payload)
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO entry_tables (table_name, key) VALUES (?, ?)",
+                [(table, key) for table in tables]
+            )
+            count = conn.execute("SELECT count(*) FROM entries").fetchone()[0]
+            if count > self.max_entries:
+                self._delete(
+                    conn, "key IN (SELECT key FROM entries ORDER BY accessed LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            conn.execute("COMMIT")
+
+    def invalidate(self, table):
+        with self._lock, closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._delete(
+                conn, "key IN (SELECT key FROM entry_tables WHERE table_name = ?)", (table,)
+            )
+            conn.execute("COMMIT")
+
+    def clear(self):
+        with self._lock, closing(self._connect()) as conn:
+            conn.execute("DELETE FROM entry_tables")
+            conn.execute("DELETE FROM entries")
+
+    def __len__(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT count(*) FROM entries").fetchone()[0]
@@ -0,0 +1,100 @@
+import importlib
+import pickle
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+# Column rows are stored as plain tuples. Entities are stored as a flat list
+# of (class, column values, loaded relationships) with relationships pointing
+# at list positions, so eager loaded relations (prefetch / include) survive
+# and shared or cyclic references stay shared. They come back as detached
+# instances; relationships that were never loaded stay unloaded.
+
+def _class_path(cls):
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+def _load_class(path):
+    module, _, name = path.partition(":")
+    obj = importlib.import_module(module)
+    for i in name.split("."):
+        obj = getattr(obj, i)
+    return obj
+
+def _encode_instance(instance, objects, memo, tables):
+    if id(instance) in memo:
+        return memo[id(instance)]
+
+    mapper = inspect(instance.__class__)
+    index = len(objects)
+    memo[id(instance)] = index
+    # deferred columns are not in __dict__ and stay unloaded after decode
+    columns = {
+        attr.key:instance.__dict__[attr.key]
+        for attr in mapper.column_attrs if attr.key in instance.__dict__
+    }
+    relations = {}
+    objects.append((_class_path(mapper.class_), columns, relations))
+
+    for relation in mapper.relationships:
+        if relation.key not in instance.__dict__:
+            continue
+        tables.add(relation.mapper.local_table.name)
+        value = instance.__dict__[relation.key]
+        if value is None:
+            relations[relation.key] = None
+        elif relation.uselist:
+            relations[relation.key] = [_encode_instance(i, objects, memo, tables) for i in value]
+        else:
+            relations[relation.key] = _encode_instance(value, objects, memo, tables)
+    return index
+
+def encode_rows(rows, tables=None):
+    rows = list(rows)
+    tables = set() if tables is None else tables
+    if rows and hasattr(rows[0], "_sa_instance_state"):
+        objects, memo = [], {}
+        roots = [_encode_instance(row, objects, memo, tables) for row in rows]
+        return ("entity", objects, roots)
+    return ("rows", [tuple(row) for row in rows], None)
+
+def decode_rows(data):
+    kind, values, roots = data
+    if kind != "entity":
+        return [tuple(i) for i in values]
+
+    classes = {}
+    instances = []
+    for path, columns, _ in values:
+        if path not in classes:
+            classes[path] = inspect(_load_class(path)).class_manager
+        instance = classes[path].new_instance()
+        for key, i in columns.items():
+            set_committed_value(instance, key, i)
+        instances.append(instance)
+
+    for instance, (_, _, relations) in zip(instances, values):
+        for key, i in relations.items():
+            if type(i) == list:
+                i = [instances[j] for j in i]
+            elif i is not None:
+                i = instances[i]
+            set_committed_value(instance, key, i)
+
+    for instance in instances:
+        make_transient_to_detached(instance)
+    return [instances[i] for i in roots]
+
+# Pagination responses keep their shape, only "results" is encoded
+# tables collects the tables of every loaded relationship
+def encode(data, tables=None):
+    if type(data) == dict:
+        data = {**data, "results":encode_rows(data.get("results", []), tables)}
+    else:
+        data = encode_rows(data, tables)
+    return pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+
+def decode(payload):
+    data = pickle.loads(payload)
+    if type(data) == dict:
+        return {**data, "results":decode_rows(data["results"])}
+    return decode_rows(data)
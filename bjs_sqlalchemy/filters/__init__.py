@@ -1,50 +1,133 @@
 import json
+import sys
+import warnings
+from sqlalchemy import and_, not_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer, load_only
+from bjs_sqlalchemy.proxy_request import to_request_params, QueryParamsError
+from bjs_sqlalchemy.filters.plan import (
+    FilterField, FilterFieldError, IN_OPERATIONS, compile_plan
+)
+from bjs_sqlalchemy.filters.joins import JoinRegistry
+from bjs_sqlalchemy.filters.in_strategies import IN_STRATEGIES, get_in_strategy
+from bjs_sqlalchemy.filters.coercion import FilterValidationError
+from bjs_sqlalchemy.filters.explain import Explain, explain_result
+from bjs_sqlalchemy.filters.expression import ExpressionError, Leaf, parse
+from bjs_sqlalchemy.filters.projection import compile_projection, parse_fields
+from bjs_sqlalchemy.filters.prefetch import compile_prefetch, joined_option, loader_option
+from bjs_sqlalchemy.filters.ordering import (
+    OrderingIndexWarning, compile_ordering, index_supports, parse_ordering, primary_key
+)
+
+# every FilterSet subclass with a compiled plan, read by filters.advisor
+registry = []
 
 class GetField:
     @property
     def _get_common_keys(self):
-        filter_keys = set(self._filter_field)
         param_keys = set(self._params.keys())
-        return list(filter_keys & param_keys)
+        return sorted(self._plan.keys() & param_keys)
 
 class FilterSet(GetField):
+    max_in_values = 1000
+    in_strategy = "auto"
+    in_threshold = 500
+    usage = None
+    expression_param = None
+    max_expression_terms = 32
+    ordering_param = "ordering"
+    fields_param = "fields"
+    include_param = "include"
+    _plan = {}
+    _ordering_plan = {}
+    _projection = {}
+    _deferred = ()
+    _prefetch = {}
+    _includes = {}
+    _ordering_warned = set()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        meta = getattr(cls, "Meta", None)
+        if getattr(meta, "model", None) is None:
+            return
+        in_strategy = getattr(meta, "in_strategy", cls.in_strategy)
+        if type(in_strategy) == str and in_strategy not in ("auto", *IN_STRATEGIES):
+            raise FilterFieldError(f"Unknown in_strategy '{in_strategy}'")
+
+        cls._plan = compile_plan(
+            meta.model, getattr(meta, "fields", ()),
+            strategy=getattr(meta, "strategy", "join"),
+            field_strategy=getattr(meta, "field_strategy", None)
+        )
+        ordering = [key for key, _ in parse_ordering(getattr(meta, "ordering", ()))]
+        cls._ordering_plan = compile_ordering(
+            meta.model, [*getattr(meta, "ordering_fields", ()), *ordering]
+        )
+        cls._projection = compile_projection(meta.model, getattr(meta, "projection_fields", ()))
+        cls._deferred = tuple(compile_projection(meta.model, getattr(meta, "deferred", ())).values())
+        cls._prefetch = compile_prefetch(meta.model, getattr(meta, "prefetch", ()))
+        cls._includes = compile_prefetch(meta.model, getattr(meta, "includes", ()))
+        registry.append(cls)
 
-    __valid_in_operation = {
-        "eq": "__eq__",
-        "in": "in_",
-        "not_in": "not_in",
-    }
-
-    __not_valid_in_operation = {  
-        "ne": "__ne__", 
-        "lt": "__lt__",
-        "lte": "__le__",
-        "gt": "__gt__",
-        "gte": "__ge__",
-        "is": "is_",
-        "icontains":"like",
-        "like": "like",
-        "ilike": "ilike", 
-        "not_like": "notlike",
-        "not_ilike": "notilike",
-    }
-
-    __operation = {**__valid_in_operation, **__not_valid_in_operation}
-    
-    def __init__(self, params, queryset):
-        self._params = params
+    def __init__(self, params, queryset, session=None):
+        self._params = to_request_params(params)
         self._queryset = queryset
-        self.__model = self.__class__.Meta.model
-        self._filter_field = self.__class__.Meta.fields
-    
-    @staticmethod
-    def _exact_query(key, model, value_list:list, op=None):
-        val = value_list if len(value_list) >1 else value_list[0]
-        op = op if op else "__eq__" if type(val) != list else "in_"
-        attr = getattr(model, key)
-        filter_func = getattr(attr, op)(val)
-        return (filter_func,)
-    
+        self._base_queryset = queryset
+        self._session = session
+        meta = self.__class__.Meta
+        self._joins = JoinRegistry(meta.model)
+        self._filter_field = meta.fields
+        self._max_in_values = getattr(meta, "max_in_values", self.max_in_values)
+        self._in_strategy = getattr(meta, "in_strategy", self.in_strategy)
+        self._in_threshold = getattr(meta, "in_threshold", self.in_threshold)
+        self._usage = getattr(meta, "usage", self.usage)
+        self._expression_param = getattr(meta, "expression_param", self.expression_param)
+        self._max_expression_terms = getattr(meta, "max_expression_terms", self.max_expression_terms)
+        self._ordering_param = getattr(meta, "ordering_param", self.ordering_param)
+        self._default_ordering = getattr(meta, "ordering", ())
+        self._fields_param = getattr(meta, "fields_param", self.fields_param)
+        self._include_param = getattr(meta, "include_param", self.include_param)
+        self._errors = []
+
+    def _check_in_size(self, key, value_list):
+        if len(value_list) > self._max_in_values:
+            raise QueryParamsError(
+                f"'{key}' has more than {self._max_in_values} values"
+            )
+
+    @property
+    def _dialect(self):
+        dialect = getattr(self.__class__.Meta, "dialect", None)
+        if dialect:
+            return dialect
+
+        session = self._session or getattr(self._queryset, "session", None)
+        try:
+            return session.get_bind().dialect.name
+        except Exception:
+            return None
+
+    # Equality always compiles to an expanding IN so one SQL string serves any
+    # number of values; != values are folded into NOT IN for the same reason
+    def _in_clause(self, column, value_list, negate=False):
+        strategy = get_in_strategy(
+            self._in_strategy, self._dialect, len(value_list), self._in_threshold
+        )
+        return strategy(column, value_list, negate=negate)
+
+    def _coerce(self, field:FilterField, value_list):
+        if field.coerce is None:
+            return value_list
+
+        data = []
+        for value in value_list:
+            try:
+                data.append(field.coerce(value))
+            except ValueError as e:
+                self._errors.append({field.key:str(e)})
+        return data
+
     @staticmethod
     def _valid_json_string(string):
         try:
@@ -52,91 +135,311 @@ class FilterSet(GetField):
             return json.loads(string)
         except Exception as e:
             return string
-        
 
-    def _in_constrain(self, key, model, op, value_list):
+    def _in_constrain(self, field:FilterField, column, value_list):
         trim_data = []
 
         for i in value_list:
             data_list = self._valid_json_string(i)
-            
+
             if type(data_list) == list:
                 trim_data.extend(data_list)
             else:
                 trim_data.append(data_list)
 
-        return self._exact_query(
-            key=key, model=model, value_list=[trim_data], op=self.__operation[op]
-        )
-    
-    def __non_constrain_filter(self, key, model, op, value_list):
-        data = tuple()
-        for i in value_list:
-            value = ["%{}%".format(i)] if op == "icontains" else [i]
-            data+= self._exact_query(
-            key=key, model=model, value_list=value, op=self.__operation[op]
-        )
-        return data
-    
-    def _constrain_filter(self, key, model, op, value_list):
-        if op == "in" or op == "not_in":
-            return self._in_constrain(key, model, op, value_list)
-        
-        if op in self.__not_valid_in_operation.keys() and len(value_list) >1:
-            return self.__non_constrain_filter(key, model, op, value_list)
+            self._check_in_size(field.key, trim_data)
 
+        trim_data = self._coerce(field, trim_data)
+        return (self._in_clause(column, trim_data, negate=field.op == "not_in"),)
 
-        if op == "icontains":
-            value_list = ["%{}%".format(value_list[0])]
+    def _constrain_filter(self, field:FilterField, column, value_list):
+        if field.op == "in" or field.op == "not_in":
+            return self._in_constrain(field, column, value_list)
 
-        return self._exact_query(
-            key=key, model=model, value_list=value_list, op=self.__operation[op]
-        )
+        value_list = self._coerce(field, value_list)
 
-    def _advance_filter(self, key, value_list):
-        join_list = key.split("__")
-        constrain = join_list[-1]
-        relation_fields = join_list[:-1] if not constrain in self.__operation.keys() else join_list[:-2]
-        model = self.__model
-        
-        for i in relation_fields:
-            attr = getattr(model, i)
-            self._queryset = self._queryset.outerjoin(attr)
-            model = attr.property.mapper.class_
-
-        if not constrain in self.__operation.keys():
-            filter_func = self._exact_query(
-                key=constrain, model=model, value_list=value_list
-            )
-    
-        else:
-            filter_func = self._constrain_filter(
-                key=join_list[-2], model=model, op=constrain, value_list=value_list
-            )
+        if field.op is None or field.op in IN_OPERATIONS:
+            return (self._in_clause(column, value_list),)
+
+        if field.op == "ne":
+            return (self._in_clause(column, value_list, negate=True),)
+
+        return tuple(field.operator(column, value) for value in value_list)
+
+    def _advance_filter(self, field:FilterField):
+        self._queryset, entity = self._joins.join(self._queryset, field.path)
+        return field.column(entity)
+
+    @staticmethod
+    def _exists_filter(path, clauses):
+        clause = and_(*clauses)
+        for attr in reversed(path):
+            clause = attr.any(clause) if attr.property.uselist else attr.has(clause)
+        return clause
+
+    def _leaf_clause(self, leaf:Leaf):
+        field = self._plan[leaf.key]
+        value_list = [value for value in leaf.values if value is not None and value != ""]
+        if not value_list:
+            self._errors.append({self._expression_param:f"'{leaf.key}' has no value"})
+            return None
+        self._check_in_size(leaf.key, value_list)
+
+        if field.strategy == "exists":
+            clauses = self._constrain_filter(field, field.column(), value_list)
+            # every value failed coercion, the error is already recorded
+            return self._exists_filter(field.path, clauses) if clauses else None
+
+        column = self._advance_filter(field)
+        clauses = self._constrain_filter(field, column, value_list)
+        return and_(*clauses) if clauses else None
+
+    def _expression_clause(self, node):
+        if type(node) == Leaf:
+            return self._leaf_clause(node)
+
+        clauses = [self._expression_clause(i) for i in node.children]
+        if any(i is None for i in clauses):
+            return None
+        if node.op == "not":
+            return not_(clauses[0])
+        return or_(*clauses) if node.op == "or" else and_(*clauses)
+
+    # One WHERE tree for every filter= value; the leaves reuse the compiled
+    # plan so joins, coercion and IN strategies match the plain parameters
+    def _expression_filter(self, used):
+        data = tuple()
+        param = self._expression_param
+        if not param:
+            return data
+
+        for text in self._params.getlist(param):
+            if text is None or text == "":
+                continue
+            try:
+                node = parse(text, max_terms=self._max_expression_terms)
+            except ExpressionError as e:
+                self._errors.append({param:str(e)})
+                continue
 
-        return filter_func
+            unknown = [i.key for i in node.leaves() if i.key not in self._plan]
+            if unknown:
+                self._errors.extend({param:f"'{key}' is not a filter field"} for key in unknown)
+                continue
+
+            used.extend(i.key for i in node.leaves())
+            clause = self._expression_clause(node)
+            if clause is not None:
+                data += (clause,)
+        return data
 
     def __filter(self):
         data = tuple()
-        
+        exists = {}
+        used = []
+        self._errors = []
+
         for key in self._get_common_keys:
             value_list = self._params.getlist(key)
-            trim_value = [value for value in value_list if value]
+            trim_value = [value for value in value_list if value is not None and value != ""]
             if trim_value:
-                if not "__" in key:
-                    filter_func = self._exact_query(
-                        key=key, model=self.__model, value_list=trim_value
+                self._check_in_size(key, trim_value)
+                field = self._plan[key]
+                used.append(key)
+
+                if field.strategy == "exists":
+                    exists[field.path] = exists.get(field.path, ()) + self._constrain_filter(
+                        field, field.column(), trim_value
                     )
-                else:
-                    filter_func = self._advance_filter(key, value_list=trim_value)
+                    continue
+
+                column = self._advance_filter(field)
+                data += self._constrain_filter(field, column, trim_value)
 
-                data += filter_func
+        data += self._expression_filter(used)
+
+        if self._usage is not None:
+            self._usage.record(self.__class__, used)
+
+        if self._errors:
+            raise FilterValidationError(self._errors)
+
+        for path, clauses in exists.items():
+            if clauses:
+                data += (self._exists_filter(path, clauses),)
 
         return data
-    
+
+    def _warn_ordering(self, fields):
+        key = (self.__class__, tuple(i.key for i in fields))
+        if key in self._ordering_warned:
+            return
+        self._ordering_warned.add(key)
+        if not index_supports(self.__class__.Meta.model, fields):
+            warnings.warn(
+                f"{self.__class__.__name__}: no index supports ordering by "
+                f"{', '.join(i.key for i in fields)}", OrderingIndexWarning,
+                stacklevel=self._caller_stacklevel()
+            )
+
+    @staticmethod
+    def _caller_stacklevel():
+        # .qs is reached through all(), explain(), batch() ..., point the
+        # warning at the first frame outside the package
+        level, frame = 2, sys._getframe(2)
+        while frame is not None and frame.f_globals.get("__name__", "").startswith("bjs_sqlalchemy."):
+            level += 1
+            frame = frame.f_back
+        return level
+
+    # ?ordering=-name,address__name, checked against Meta.ordering_fields;
+    # the primary key is always appended so every page is deterministic
+    def _order(self, query):
+        if not self._ordering_plan:
+            return query
+
+        param = self._ordering_param
+        ordering = parse_ordering(self._params.getlist(param) if param else ())
+        ordering = ordering or parse_ordering(self._default_ordering)
+        if not ordering:
+            return query
+
+        errors = [
+            {param:f"'{key}' is not an ordering field"}
+            for key, _ in ordering if key not in self._ordering_plan
+        ]
+        if errors:
+            raise FilterValidationError(errors)
+
+        fields = [self._ordering_plan[key] for key, _ in ordering]
+        self._warn_ordering(fields)
+
+        clauses = []
+        for field, (key, descending) in zip(fields, ordering):
+            query, entity = self._joins.join(query, field.path)
+            column = field.column(entity)
+            clauses.append(column.desc() if descending else column.asc())
+
+        model = self.__class__.Meta.model
+        ordered = [i.attribute for i in fields if not i.path]
+        clauses += [i for i in primary_key(model) if not any(i is j for j in ordered)]
+        return query.order_by(*clauses)
+
+    # ?fields=id,name loads only the listed columns (checked against
+    # Meta.projection_fields); without it Meta.deferred columns are deferred
+    def _project(self, query):
+        param = self._fields_param
+        keys = parse_fields(self._params.getlist(param)) if param and self._projection else []
+
+        if not keys:
+            return query.options(*[defer(i) for i in self._deferred]) if self._deferred else query
+
+        errors = [{param:f"'{key}' is not a selectable field"} for key in keys if key not in self._projection]
+        if errors:
+            raise FilterValidationError(errors)
+
+        return query.options(load_only(*[self._projection[key] for key in keys]))
+
+    # Meta.prefetch is always loaded, ?include= picks from Meta.includes;
+    # without joins (a statement loaded through from_statement) joined loads
+    # are issued as selectin
+    def _eager(self, query, joins=True):
+        param = self._include_param
+        keys = parse_fields(self._params.getlist(param)) if param and self._includes else []
+
+        errors = [{param:f"'{key}' is not an includable relation"} for key in keys if key not in self._includes]
+        if errors:
+            raise FilterValidationError(errors)
+
+        loads = dict(self._prefetch)
+        for key in keys:
+            loads.setdefault(key, self._includes[key])
+        if not loads:
+            return query
+        if not joins:
+            loads = {
+                key:(path, "selectin" if strategy == "joined" else strategy)
+                for key, (path, strategy) in loads.items()
+            }
+
+        strategies = {key:strategy for key, (_, strategy) in loads.items()}
+        options = []
+        for path, strategy in loads.values():
+            options.append(
+                joined_option(path, self._joins) or loader_option(path, strategy, strategies)
+            )
+        return query.options(*options)
+
     @property
     def qs(self):
+        return self._eager(self._project(self._order(self._filtered())))
+
+    # the loader options of .qs for a statement without the filter joins,
+    # batch() applies them around its union
+    def _load_options(self):
+        model = self.__class__.Meta.model
+        self._joins = JoinRegistry(model)
+        return self._eager(self._project(select(model)), joins=False)._with_options
+
+    def _filtered(self):
+        # joins start over on every evaluation, ordering joins only live on the
+        # returned statement and a second .qs must not find them registered
+        self._queryset = self._base_queryset
+        self._joins = JoinRegistry(self.__class__.Meta.model)
         filter_data = self.__filter()
-        query = self._queryset.filter(*filter_data)
-        return query
+        return self._queryset.filter(*filter_data)
+
+    @staticmethod
+    def _statement(query):
+        return query.statement if hasattr(query, "statement") else query
+
+    def _get_session(self, query, session=None):
+        session = session or self._session or getattr(query, "session", None)
+        if session is None:
+            raise ValueError(f"{self.__class__.__name__} needs a session to execute a select()")
+        return session
+
+    def explain(self, session=None, analyze=False):
+        query = self.qs
+        session = self._get_session(query, session)
+        statement = self._statement(query)
+        result = session.execute(Explain(statement, analyze=analyze))
+        return explain_result(statement, session.get_bind().dialect, result)
+
+    async def async_explain(self, session=None, analyze=False):
+        query = self.qs
+        session = self._get_session(query, session)
+        statement = self._statement(query)
+        result = await session.execute(Explain(statement, analyze=analyze))
+        return explain_result(statement, session.get_bind().dialect, result)
+
+    # The same statement runs on a Session or an AsyncSession; with an
+    # AsyncSession the methods below return awaitables
+    def _execute(self, statement, handle, session=None):
+        session = self._get_session(self._queryset, session)
+        if isinstance(session, AsyncSession):
+            async def run():
+                return handle(await session.execute(statement))
+            return run()
+        return handle(session.execute(statement))
+
+    @staticmethod
+    def _is_entity(statement):
+        descriptions = statement.column_descriptions
+        return len(descriptions) == 1 and descriptions[0].get("entity") is descriptions[0].get("expr")
+
+    def all(self, session=None):
+        statement = self._statement(self.qs)
+        if self._is_entity(statement):
+            return self._execute(statement, lambda i: i.scalars().unique().all(), session)
+        return self._execute(statement, lambda i: i.all(), session)
+
+    def first(self, session=None):
+        statement = self._statement(self.qs).limit(1)
+        if self._is_entity(statement):
+            return self._execute(statement, lambda i: i.scalars().unique().first(), session)
+        return self._execute(statement, lambda i: i.first(), session)
 
+    def scalars(self, session=None):
+        statement = self._statement(self.qs)
+        return self._execute(statement, lambda i: i.scalars(), session)
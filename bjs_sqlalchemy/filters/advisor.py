@@ -0,0 +1,158 @@
+import argparse
+import importlib
+import sys
+from typing import NamedTuple, Optional, Tuple
+from sqlalchemy import Index, MetaData, Table, UniqueConstraint, create_mock_engine, func
+from sqlalchemy.schema import CreateIndex
+
+# Leading-wildcard and full-text operators cannot use a btree index
+UNINDEXABLE_OPERATIONS = {"icontains", "like", "ilike", "not_like", "not_ilike", "search"}
+
+class IndexSuggestion(NamedTuple):
+    table: str
+    columns: Tuple[str, ...]
+    expression: Optional[str]
+    reasons: Tuple[str, ...]
+    # FilterSets may span several MetaData, the suggestion keeps its own table
+    source: Optional[Table] = None
+
+    @property
+    def name(self):
+        suffix = "_".join(self.columns)
+        if self.expression:
+            suffix = f"{suffix}_{self.expression}"
+        return f"ix_{self.table}_{suffix}"
+
+    def index(self, metadata=None):
+        # built on a copy, an Index attaches itself to the table it references
+        if metadata is None:
+            source = self.source
+        else:
+            source = metadata.tables[self.source.fullname if self.source is not None else self.table]
+        table = source.to_metadata(MetaData())
+        if self.expression == "lower":
+            return Index(self.name, func.lower(table.c[self.columns[0]]))
+        return Index(self.name, *[table.c[i] for i in self.columns])
+
+    def ddl(self, metadata=None, dialect=None):
+        statement = CreateIndex(self.index(metadata), if_not_exists=True)
+        return str(statement.compile(dialect=dialect)).strip() + ";"
+
+    def alembic(self):
+        if self.expression == "lower":
+            columns = f'[sa.text("lower({self.columns[0]})")]'
+        else:
+            columns = repr(list(self.columns))
+        return f'op.create_index("{self.name}", "{self.table}", {columns})'
+
+def is_indexed(column):
+    table = column.table
+    if column.primary_key and list(table.primary_key.columns)[0] is column:
+        return True
+
+    for index in table.indexes:
+        expressions = list(index.expressions)
+        if expressions and expressions[0] is column:
+            return True
+
+    for constraint in table.constraints:
+        if type(constraint) == UniqueConstraint:
+            columns = list(constraint.columns)
+            if columns and columns[0] is column:
+                return True
+    return False
+
+def has_lower_index(column):
+    for index in column.table.indexes:
+        expressions = list(index.expressions)
+        if expressions and str(expressions[0]) == str(func.lower(column)):
+            return True
+    return False
+
+def _join_columns(path):
+    for attr in path:
+        for local, remote in attr.property.local_remote_pairs:
+            yield local
+            yield remote
+
+def _filter_column(field):
+    columns = getattr(field.attribute.property, "columns", None)
+    return columns[0] if columns else None
+
+def advise(filtersets=None):
+    from bjs_sqlalchemy.filters import registry
+
+    # keyed by the Table, same named tables of other MetaData / schemas
+    # are suggested separately
+    suggestions = {}
+
+    def add(table, columns, expression, reason):
+        key = (table, columns, expression)
+        reasons = suggestions.get(key, ())
+        if reason not in reasons:
+            suggestions[key] = reasons + (reason,)
+
+    for filterset in filtersets or registry:
+        for key, field in sorted(filterset._plan.items()):
+            label = f"{filterset.__name__}.{key}"
+
+            for column in _join_columns(field.path):
+                if getattr(column, "table", None) is not None and not is_indexed(column):
+                    add(column.table, (column.name,), None, f"join: {label}")
+
+            column = _filter_column(field)
+            if column is None or field.op in UNINDEXABLE_OPERATIONS:
+                continue
+
+            if field.op == "istartswith":
+                if not has_lower_index(column):
+                    add(column.table, (column.name,), "lower", f"filter: {label}")
+            elif not is_indexed(column):
+                add(column.table, (column.name,), None, f"filter: {label}")
+
+    return [
+        IndexSuggestion(table.name, columns, expression, reasons, table)
+        for (table, columns, expression), reasons in sorted(
+            suggestions.items(), key=lambda i: (i[0][0].fullname, i[0][1], i[0][2] or "")
+        )
+    ]
+
+def _dialect(name):
+    if not name:
+        return None
+    return create_mock_engine(f"{name}://", executor=None).dialect
+
+def report(suggestions, output="text", metadata=None, dialect=None):
+    lines = []
+    for suggestion in suggestions:
+        if output == "sql":
+            lines.append(suggestion.ddl(metadata, _dialect(dialect)))
+        elif output == "alembic":
+            lines.append(suggestion.alembic())
+        else:
+            column = ", ".join(suggestion.columns)
+            if suggestion.expression:
+                column = f"{suggestion.expression}({column})"
+            lines.append(f"{suggestion.table}({column})  <- {'; '.join(suggestion.reasons)}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Report columns and join keys used by FilterSet Meta.fields that have no index."
+    )
+    parser.add_argument("modules", nargs="+", help="modules declaring FilterSet classes")
+    parser.add_argument("--format", choices=("text", "sql", "alembic"), default="text")
+    parser.add_argument("--dialect", default=None, help="dialect used for --format sql")
+    args = parser.parse_args(argv)
+
+    for module in args.modules:
+        importlib.import_module(module)
+
+    suggestions = advise()
+    output = report(suggestions, args.format, dialect=args.dialect)
+    if output:
+        print(output)
+    return 1 if suggestions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import inspect
+from sqlalchemy import func, literal, select, union_all
+from bjs_sqlalchemy.cache import ResultCache
+from bjs_sqlalchemy.filters.ordering import ordered, primary_key
+from bjs_sqlalchemy.pagination.mixin import run_together
+
+# Several (FilterSet, params) pairs over the same model run as one
+#   SELECT * FROM (SELECT 0 AS batch_tag, ... UNION ALL SELECT 1, ...)
+# each branch keeps its ordering through row_number(), which also serves
+# an optional per filter limit. Meta.prefetch, ?include= and ?fields= are
+# applied to the outer select, filters with different loads get a union
+# of their own
+
+def _items(requests):
+    return list(requests.items()) if hasattr(requests, "items") else list(enumerate(requests))
+
+def _results(requests, data):
+    if hasattr(requests, "items"):
+        return data
+    return [data[i] for i in range(len(data))]
+
+def _statement(filter_class, params, session):
+    model = filter_class.Meta.model
+    return filter_class(params=params, queryset=select(model), session=session).qs
+
+def batch_statement(model, statements, limit=None, options=()):
+    table_columns = list(model.__table__.columns)
+    branches = []
+    for tag, statement in enumerate(statements):
+        order = list(statement._order_by_clauses) or primary_key(model)
+        row = func.row_number().over(order_by=order).label("batch_row")
+        subquery = statement.order_by(None).with_only_columns(*table_columns, row).subquery()
+        branch = select(literal(tag).label("batch_tag"), *subquery.c)
+        if limit:
+            branch = branch.where(subquery.c.batch_row <= limit)
+        branches.append(branch)
+
+    union = union_all(*branches).subquery("batch")
+    rows = select(union).order_by(union.c.batch_tag, union.c.batch_row)
+    return select(model, union.c.batch_tag).options(*options).from_statement(rows)
+
+def _groups(requests, session):
+    groups = {}
+    for key, (filter_class, params) in _items(requests):
+        model = filter_class.Meta.model
+        filter_set = filter_class(params=params, queryset=select(model), session=session)
+        statement = filter_set.qs
+        options = filter_set._load_options()
+        loads = repr(ResultCache.loader_options(select(model).options(*options)))
+        group = groups.setdefault((model, loads), (model, options, []))
+        group[2].append((key, statement))
+    return groups.values()
+
+def _collect(data, keys, rows):
+    seen = set()
+    for instance, tag in rows:
+        key = keys[tag]
+        # one-to-many filter joins repeat the root row
+        if (key, id(instance)) not in seen:
+            seen.add((key, id(instance)))
+            data[key].append(instance)
+
+def batch(session, requests, limit=None):
+    data = {key:[] for key, _ in _items(requests)}
+    for model, options, items in _groups(requests, session):
+        statement = batch_statement(model, [i[1] for i in items], limit, options)
+        _collect(data, [i[0] for i in items], session.execute(statement).all())
+    return _results(requests, data)
+
+async def async_batch(session, requests, limit=None):
+    data = {key:[] for key, _ in _items(requests)}
+    for model, options, items in _groups(requests, session):
+        statement = batch_statement(model, [i[1] for i in items], limit, options)
+        result = await session.execute(statement)
+        _collect(data, [i[0] for i in items], result.all())
+    return _results(requests, data)
+
+async def async_fan_out(session_factory, requests, limit=None):
+    # one session, and so one pooled connection, per filter; run concurrently,
+    # the first failure cancels the others and their sessions are closed
+    async def run(filter_class, params):
+        session = session_factory()
+        if inspect.isawaitable(session):
+            session = await session
+        try:
+            statement = _statement(filter_class, params, session)
+            if limit:
+                statement = ordered(statement).limit(limit)
+            result = await session.execute(statement)
+            return result.scalars().unique().all()
+        finally:
+            await session.close()
+
+    items = _items(requests)
+    results = await run_together(*[run(*request) for _, request in items])
+    return _results(requests, {key:value for (key, _), value in zip(items, results)})
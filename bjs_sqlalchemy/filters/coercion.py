@@ -0,0 +1,108 @@
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
+
+class FilterValidationError(ValueError):
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+TRUE_VALUES = {"1", "true", "t", "yes", "y", "on"}
+FALSE_VALUES = {"0", "false", "f", "no", "n", "off"}
+NULL_VALUES = {"null", "none"}
+
+def _to_bool(value):
+    if type(value) == bool:
+        return value
+
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"'{value}' is not a valid boolean")
+
+def _to_int(value):
+    if type(value) == bool:
+        raise ValueError(f"'{value}' is not a valid integer")
+
+    if type(value) == float:
+        if not value.is_integer():
+            raise ValueError(f"'{value}' is not a valid integer")
+        return int(value)
+
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{value}' is not a valid integer")
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{value}' is not a valid number")
+
+def _to_decimal(value):
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"'{value}' is not a valid decimal")
+
+def _iso(python_type, name):
+    def coerce(value):
+        if type(value) == python_type:
+            return value
+        try:
+            return python_type.fromisoformat(str(value))
+        except ValueError:
+            raise ValueError(f"'{value}' is not a valid {name}")
+    return coerce
+
+def _to_uuid(value):
+    try:
+        return value if type(value) == uuid.UUID else uuid.UUID(str(value))
+    except ValueError:
+        raise ValueError(f"'{value}' is not a valid UUID")
+
+def _to_str(value):
+    return value if type(value) == str else str(value)
+
+COERCERS = {
+    str: _to_str,
+    bool: _to_bool,
+    int: _to_int,
+    float: _to_float,
+    Decimal: _to_decimal,
+    datetime: _iso(datetime, "datetime"),
+    date: _iso(date, "date"),
+    time: _iso(time, "time"),
+    uuid.UUID: _to_uuid,
+}
+
+# Pattern operators compare text and keep the raw value
+PATTERN_OPERATIONS = {
+    "icontains", "like", "ilike", "not_like", "not_ilike",
+    "startswith", "istartswith",
+}
+
+def _to_search(value):
+    # a MATCH / to_tsquery without a single term is a syntax error
+    if not str(value).split():
+        raise ValueError(f"'{value}' has no search terms")
+    return value
+
+def get_coercer(python_type, op=None):
+    if op == "search":
+        return _to_search
+    if op in PATTERN_OPERATIONS or python_type is None:
+        return None
+
+    coerce = COERCERS.get(python_type)
+    if coerce is None or op != "is":
+        return coerce
+
+    def coerce_is(value):
+        if type(value) == str and value.strip().lower() in NULL_VALUES:
+            return None
+        return coerce(value)
+    return coerce_is
@@ -0,0 +1,95 @@
+import re
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.elements import ClauseElement
+
+FULL_SCAN = "full_scan"
+TEMP_BTREE = "temp_btree"
+FILESORT = "filesort"
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement, analyze=False, format=None):
+        self.statement = statement
+        self.analyze = analyze
+        self.format = format
+
+@compiles(Explain)
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN " + compiler.process(element.statement, **kw)
+
+@compiles(Explain, "sqlite")
+def _compile_explain_sqlite(element, compiler, **kw):
+    return "EXPLAIN QUERY PLAN " + compiler.process(element.statement, **kw)
+
+@compiles(Explain, "postgresql")
+def _compile_explain_postgresql(element, compiler, **kw):
+    if element.format:
+        options = ["ANALYZE"] * element.analyze + [f"FORMAT {element.format.upper()}"]
+        prefix = f"EXPLAIN ({', '.join(options)}) "
+    else:
+        prefix = "EXPLAIN ANALYZE " if element.analyze else "EXPLAIN "
+    return prefix + compiler.process(element.statement, **kw)
+
+def _warning(type_, table, detail):
+    return {"type":type_, "table":table, "detail":detail}
+
+def _sqlite_warnings(plan):
+    warnings = []
+    for row in plan:
+        detail = row[-1]
+        scan = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+        if scan and "INDEX" not in detail and scan.group(1) != "CONSTANT":
+            warnings.append(_warning(FULL_SCAN, scan.group(1), detail))
+        if "USE TEMP B-TREE" in detail:
+            warnings.append(_warning(TEMP_BTREE, None, detail))
+    return warnings
+
+def _postgresql_warnings(plan):
+    warnings = []
+    for row in plan:
+        detail = row[0]
+        scan = re.search(r"Seq Scan on (\w+)", detail)
+        if scan:
+            warnings.append(_warning(FULL_SCAN, scan.group(1), detail.strip()))
+        if re.search(r"(^|->\s*)Sort\b", detail.strip()):
+            warnings.append(_warning(FILESORT, None, detail.strip()))
+    return warnings
+
+def _mysql_warnings(plan, keys):
+    warnings = []
+    for row in plan:
+        row = dict(zip(keys, row))
+        extra = row.get("Extra") or ""
+        if row.get("type") == "ALL":
+            warnings.append(_warning(FULL_SCAN, row.get("table"), extra))
+        if "Using temporary" in extra:
+            warnings.append(_warning(TEMP_BTREE, row.get("table"), extra))
+        if "Using filesort" in extra:
+            warnings.append(_warning(FILESORT, row.get("table"), extra))
+    return warnings
+
+def plan_warnings(dialect, plan, keys=()):
+    if dialect == "sqlite":
+        return _sqlite_warnings(plan)
+    if dialect == "postgresql":
+        return _postgresql_warnings(plan)
+    if dialect in ("mysql", "mariadb"):
+        return _mysql_warnings(plan, keys)
+    return []
+
+def compile_statement(statement, dialect):
+    compiled = statement.compile(
+        dialect=dialect, compile_kwargs={"render_postcompile":True}
+    )
+    return str(compiled), dict(compiled.params)
+
+def explain_result(statement, dialect, result):
+    sql, params = compile_statement(statement, dialect)
+    keys = tuple(result.keys())
+    plan = [tuple(row) for row in result]
+    return {
+        "sql":sql, "params":params, "dialect":dialect.name,
+        "plan":plan, "warnings":plan_warnings(dialect.name, plan, keys),
+    }
@@ -0,0 +1,176 @@
+import json
+
+# filter=(name=Indranil-1|age__gt=30),!is_deleted=1
+#   ,  and      |  or      !  not      ( )  grouping
+#   values are bare text, a "json string" or a [json, list]
+class ExpressionError(ValueError):
+    pass
+
+OPERATORS = {",", "|", "(", ")", "!"}
+
+class Leaf:
+    def __init__(self, key, values):
+        self.key = key
+        self.values = values
+
+    def __repr__(self):
+        return f"Leaf({self.key!r}, {self.values!r})"
+
+class Node:
+    def __init__(self, op, children):
+        self.op = op
+        self.children = children
+
+    def __repr__(self):
+        return f"Node({self.op!r}, {self.children!r})"
+
+    def leaves(self):
+        for child in self.children:
+            if type(child) == Leaf:
+                yield child
+            else:
+                yield from child.leaves()
+
+def _read_quoted(text, start):
+    end = start + 1
+    while end < len(text):
+        if text[end] == "\\":
+            end += 2
+            continue
+        if text[end] == '"':
+            return end + 1
+        end += 1
+    raise ExpressionError("Unterminated string")
+
+def _read_list(text, start):
+    end = start + 1
+    while end < len(text):
+        if text[end] == '"':
+            end = _read_quoted(text, end)
+            continue
+        if text[end] == "]":
+            return end + 1
+        end += 1
+    raise ExpressionError("Unterminated list")
+
+def _value(raw):
+    if raw[:1] == '"':
+        try:
+            return [json.loads(raw)]
+        except ValueError:
+            raise ExpressionError(f"Invalid string {raw}")
+    if raw[:1] == "[":
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            data = [i.strip() for i in raw[1:-1].split(",") if i.strip()]
+        return data if type(data) == list else [data]
+    return [raw]
+
+def tokenize(text):
+    tokens = []
+    position = 0
+    while position < len(text):
+        char = text[position]
+        if char.isspace():
+            position += 1
+            continue
+        if char in OPERATORS:
+            tokens.append(char)
+            position += 1
+            continue
+
+        equal = text.find("=", position)
+        key = text[position:equal].strip() if equal != -1 else ""
+        if not key or not key.replace("_", "").isalnum():
+            raise ExpressionError(f"Expected key=value at position {position}")
+
+        start = equal + 1
+        while start < len(text) and text[start].isspace():
+            start += 1
+        if text[start:start+1] == '"':
+            end = _read_quoted(text, start)
+        elif text[start:start+1] == "[":
+            end = _read_list(text, start)
+        else:
+            end = start
+            while end < len(text) and text[end] not in ",|()":
+                end += 1
+
+        raw = text[start:end].strip()
+        if not raw:
+            raise ExpressionError(f"Missing value for '{key}'")
+        tokens.append(Leaf(key, _value(raw)))
+        position = end
+    return tokens
+
+class Parser:
+    def __init__(self, tokens, max_terms=32, max_depth=8):
+        self.tokens = tokens
+        self.position = 0
+        self.depth = 0
+        self.max_depth = max_depth
+        leaves = [i for i in tokens if type(i) == Leaf]
+        if len(leaves) > max_terms:
+            raise ExpressionError(f"More than {max_terms} terms")
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def _next(self):
+        token = self._peek()
+        self.position += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise ExpressionError("Empty expression")
+        node = self._or()
+        if self._peek() is not None:
+            raise ExpressionError(f"Unexpected '{self._peek()}'")
+        return node
+
+    def _or(self):
+        children = [self._and()]
+        while self._peek() == "|":
+            self._next()
+            children.append(self._and())
+        return children[0] if len(children) == 1 else Node("or", children)
+
+    def _and(self):
+        children = [self._not()]
+        while self._peek() == ",":
+            self._next()
+            children.append(self._not())
+        return children[0] if len(children) == 1 else Node("and", children)
+
+    def _not(self):
+        # read iteratively, a run of ! must not recurse once per character;
+        # NOT NOT x is x, only the parity matters
+        negate = False
+        while self._peek() == "!":
+            self._next()
+            negate = not negate
+        node = self._atom()
+        return Node("not", [node]) if negate else node
+
+    def _atom(self):
+        token = self._next()
+        if type(token) == Leaf:
+            return token
+
+        if token == "(":
+            self.depth += 1
+            if self.depth > self.max_depth:
+                raise ExpressionError(f"Nested deeper than {self.max_depth}")
+            node = self._or()
+            if self._next() != ")":
+                raise ExpressionError("Missing ')'")
+            self.depth -= 1
+            return node
+
+        raise ExpressionError("Unexpected end of expression" if token is None else f"Unexpected '{token}'")
+
+def parse(text, max_terms=32, max_depth=8):
+    node = Parser(tokenize(text), max_terms, max_depth).parse()
+    return node if type(node) == Node else Node("and", [node])
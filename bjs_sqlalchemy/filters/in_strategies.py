@@ -0,0 +1,91 @@
+from sqlalchemy import all_, and_, any_, bindparam, column as sql_column, or_, select, tuple_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import Values
+
+class PlainIn:
+    def __call__(self, column, value_list, negate=False):
+        return column.not_in(value_list) if negate else column.in_(value_list)
+
+class ChunkedIn:
+    # OR of IN lists; literal=True renders the values inline which keeps
+    # SQLite below its bound-variable limit without changing the cache key
+    def __init__(self, chunk_size=500, literal=False):
+        self.chunk_size = chunk_size
+        self.literal = literal
+
+    def _param(self, chunk):
+        return bindparam(None, chunk, expanding=True, literal_execute=self.literal)
+
+    def __call__(self, column, value_list, negate=False):
+        chunks = [
+            value_list[i:i+self.chunk_size]
+            for i in range(0, len(value_list), self.chunk_size)
+        ]
+        if negate:
+            return and_(*[column.not_in(self._param(chunk)) for chunk in chunks])
+        return or_(*[column.in_(self._param(chunk)) for chunk in chunks])
+
+class InValues(Values):
+    inherit_cache = True
+
+# SQLite takes no column list on a VALUES alias and names the columns
+# column1, column2, ...; the one column is called column1 everywhere
+@compiles(InValues, "sqlite")
+def _compile_in_values_sqlite(element, compiler, asfrom=False, from_linter=None, **kw):
+    rows = ", ".join(
+        compiler.process(tuple_(*row, types=element._column_types).self_group(), **kw)
+        for chunk in element._data
+        for row in chunk
+    )
+    sql = f"VALUES {rows}"
+    if not asfrom:
+        return sql
+    if from_linter:
+        from_linter.froms[element._de_clone()] = element.name
+    return "({}){}".format(sql, compiler.get_render_as_alias_suffix(compiler.preparer.quote(element.name)))
+
+class ValuesIn:
+    # IN (SELECT column1 FROM (VALUES ...)), the planner can hash the list
+    # into a semi join instead of testing a long IN list row by row
+    def __call__(self, column, value_list, negate=False):
+        data = InValues(sql_column("column1", column.type), name="in_values").data(
+            [(value,) for value in value_list]
+        )
+        subquery = select(data.c.column1)
+        return column.not_in(subquery) if negate else column.in_(subquery)
+
+class ArrayIn:
+    # PostgreSQL: the whole list travels as one array parameter
+    def __call__(self, column, value_list, negate=False):
+        from sqlalchemy.dialects.postgresql import ARRAY
+
+        param = bindparam(None, list(value_list), type_=ARRAY(column.type))
+        return column != all_(param) if negate else column == any_(param)
+
+IN_STRATEGIES = {
+    "in": PlainIn,
+    "chunked": ChunkedIn,
+    "values": ValuesIn,
+    "array": ArrayIn,
+}
+
+def auto_in_strategy(dialect, size, threshold=500):
+    if size <= threshold:
+        return PlainIn()
+
+    if dialect == "postgresql":
+        return ArrayIn()
+
+    if dialect == "sqlite":
+        return ChunkedIn(chunk_size=threshold, literal=True)
+
+    return ChunkedIn(chunk_size=threshold)
+
+def get_in_strategy(strategy, dialect, size, threshold=500):
+    if strategy == "auto":
+        return auto_in_strategy(dialect, size, threshold)
+
+    if type(strategy) == str:
+        return IN_STRATEGIES[strategy]()
+
+    return strategy
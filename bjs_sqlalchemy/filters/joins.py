@@ -0,0 +1,43 @@
+from sqlalchemy.orm import aliased
+
+class JoinRegistry:
+    # One outer join per relationship path; a model that is already part of
+    # the statement (self-referential or repeated paths) is joined as an alias
+    def __init__(self, model):
+        self.model = model
+        self._entities = {(): model}
+        self._models = {model}
+
+    def __contains__(self, path):
+        return tuple(path) in self._entities
+
+    def get(self, path):
+        return self._entities.get(tuple(path))
+
+    def paths(self):
+        return [path for path in self._entities if path]
+
+    def join(self, query, relations):
+        parent = self.model
+        path = tuple()
+
+        for attr in relations:
+            path += (attr.key,)
+            entity = self._entities.get(path)
+
+            if entity is None:
+                target = attr.property.mapper.class_
+                relation = getattr(parent, attr.key)
+
+                if target in self._models:
+                    entity = aliased(target)
+                    query = query.outerjoin(relation.of_type(entity))
+                else:
+                    entity = target
+                    self._models.add(target)
+                    query = query.outerjoin(relation)
+
+                self._entities[path] = entity
+            parent = entity
+
+        return query, parent
@@ -0,0 +1,389 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from itertools import compress, repeat
+from sqlalchemy.orm import selectinload
+from bjs_sqlalchemy.filters import FilterSet
+from bjs_sqlalchemy.filters.coercion import FilterValidationError
+from bjs_sqlalchemy.filters.expression import Leaf
+from bjs_sqlalchemy.filters.ordering import parse_ordering
+from bjs_sqlalchemy.filters.plan import IN_OPERATIONS, FilterFieldError
+from bjs_sqlalchemy.models import signals
+
+# A snapshot keeps every column a FilterSet can filter on as one array per
+# column (array('q') / array('d') for numbers, a list otherwise). A predicate
+# turns one column into a bytearray of 0/1 per row; masks are combined as
+# integers with one byte per row, so and / or / not run in C.
+# =, IN and lt / lte / gt / gte do not look at every row: they find their
+# rows in a per column hash or sorted index (bisect) and set those bytes
+# with map() in C. The LIKE style operators still test row by row.
+
+def _column(values):
+    kinds = {type(i) for i in values}
+    if kinds == {int}:
+        return array("q", values)
+    if kinds == {float} or kinds == {int, float}:
+        return array("d", values)
+    return values
+
+def _like(pattern, flags=0):
+    regex = "".join(
+        ".*" if i == "%" else "." if i == "_" else re.escape(i) for i in str(pattern)
+    )
+    return re.compile(regex + r"\Z", flags | re.S)
+
+def _compare(test):
+    def predicate(column, value):
+        return bytearray(i is not None and test(i, value) for i in column)
+    return predicate
+
+def _scatter(size, positions):
+    mask = bytearray(size)
+    deque(map(mask.__setitem__, positions, repeat(1)), maxlen=0)
+    return mask
+
+# slice of the sorted non NULL values a range operator selects
+RANGES = {
+    "lt": lambda values, value: (0, bisect_left(values, value)),
+    "lte": lambda values, value: (0, bisect_right(values, value)),
+    "gt": lambda values, value: (bisect_right(values, value), len(values)),
+    "gte": lambda values, value: (bisect_left(values, value), len(values)),
+}
+
+def _match(pattern, negate=False):
+    def predicate(column, value):
+        regex = pattern(value)
+        return bytearray(
+            i is not None and (regex.match(str(i)) is None) == negate for i in column
+        )
+    return predicate
+
+def _is(column, value):
+    if value is None:
+        return bytearray(i is None for i in column)
+    return bytearray(i == value for i in column)
+
+PREDICATES = {
+    "is": _is,
+    "icontains": _match(lambda v: _like(f"%{v}%", re.I)),
+    "like": _match(lambda v: _like(v)),
+    "ilike": _match(lambda v: _like(v, re.I)),
+    "not_like": _match(lambda v: _like(v), negate=True),
+    "not_ilike": _match(lambda v: _like(v, re.I), negate=True),
+    "startswith": _compare(lambda a, b: str(a).startswith(str(b))),
+    "istartswith": _compare(lambda a, b: str(a).lower().startswith(str(b).lower())),
+}
+
+class Predicate:
+    def __init__(self, field, op, values, negate=False):
+        self.path = field.relation_path
+        self.name = field.name
+        self.op = op
+        self.values = values
+        self.negate = negate
+
+class Group:
+    # a group with a path holds when one related row satisfies all of it
+    def __init__(self, op, children, path=()):
+        self.op = op
+        self.children = list(children)
+        self.path = tuple(path)
+
+class Store:
+    def __init__(self, instances, names, owners=None):
+        self.size = len(instances)
+        self.owners = owners
+        self.columns = {name:_column([getattr(i, name) for i in instances]) for name in names}
+        self._indexes = {}
+        self._sorted = {}
+        self._not_null = {}
+
+    def index(self, name):
+        if name not in self._indexes:
+            index = {}
+            for position, value in enumerate(self.columns[name]):
+                index.setdefault(value, array("q")).append(position)
+            self._indexes[name] = index
+        return self._indexes[name]
+
+    def sorted_index(self, name):
+        # (values, positions) of the non NULL values in value order
+        if name not in self._sorted:
+            column = self.columns[name]
+            positions = sorted(
+                (i for i, value in enumerate(column) if value is not None), key=column.__getitem__
+            )
+            self._sorted[name] = ([column[i] for i in positions], array("q", positions))
+        return self._sorted[name]
+
+    def not_null(self, name):
+        if name not in self._not_null:
+            self._not_null[name] = int.from_bytes(
+                bytearray(value is not None for value in self.columns[name]), "little"
+            )
+        return self._not_null[name]
+
+    def predicate(self, node):
+        column = self.columns[node.name]
+        if node.op == "in":
+            index = self.index(node.name)
+            mask = _scatter(self.size, [j for i in set(node.values) for j in index.get(i, ())])
+            if node.negate:
+                # NOT IN is never true for NULL
+                mask = int.from_bytes(mask, "little") ^ self.not_null(node.name)
+                mask = (mask & self.not_null(node.name)).to_bytes(self.size, "little")
+            return mask
+        if node.op in RANGES:
+            values, positions = self.sorted_index(node.name)
+            start, stop = RANGES[node.op](values, node.values[0])
+            return _scatter(self.size, positions[start:stop])
+        return PREDICATES[node.op](column, node.values[0])
+
+class Snapshot:
+    def __init__(self, model, session_factory, paths=(), columns=None, watch=False):
+        self.model = model
+        self.session_factory = session_factory
+        self.paths = {tuple(i) for i in paths}
+        self.extra_columns = columns or {}
+        self.stale = True
+        self._state = None
+        self._watching = False
+        if watch:
+            self.watch()
+
+    @classmethod
+    def for_filterset(cls, filter_class, session_factory, watch=False):
+        columns = {}
+        for field in [*filter_class._plan.values(), *filter_class._ordering_plan.values()]:
+            columns.setdefault(field.path, set()).add(field.name)
+        return cls(filter_class.Meta.model, session_factory, columns.keys(), columns, watch)
+
+    @property
+    def tables(self):
+        tables = {self.model.__table__.name}
+        for path in self.paths:
+            tables.update(attr.property.mapper.local_table.name for attr in path)
+        return tables
+
+    def _names(self, model, path):
+        names = set(self.extra_columns.get(path, ()))
+        if not path:
+            names.update(i.key for i in model.__mapper__.column_attrs)
+        return names
+
+    @staticmethod
+    def _follow(instance, path):
+        objects = [instance]
+        for attr in path:
+            data = []
+            for obj in objects:
+                value = getattr(obj, attr.key)
+                if value is None:
+                    continue
+                data.extend(value if attr.property.uselist else [value])
+            objects = data
+        return objects
+
+    def refresh(self, session=None):
+        own = session is None
+        session = session or self.session_factory()
+        # cleared first, a change committed while loading marks it stale again
+        self.stale = False
+        try:
+            query = session.query(self.model)
+            for path in self.paths:
+                option = None
+                for attr in path:
+                    option = selectinload(attr) if option is None else option.selectinload(attr)
+                if option is not None:
+                    query = query.options(option)
+            rows = query.order_by(*self.model.__mapper__.primary_key).all()
+
+            stores = {():Store(rows, self._names(self.model, ()))}
+            for path in self.paths:
+                if not path:
+                    continue
+                related, owners = [], array("q")
+                for position, row in enumerate(rows):
+                    for obj in self._follow(row, path):
+                        related.append(obj)
+                        owners.append(position)
+                stores[tuple(attr.key for attr in path)] = Store(related, self._names(None, path), owners)
+        except Exception:
+            self.stale = True
+            raise
+        finally:
+            if own:
+                session.close()
+
+        # swapped in one assignment, readers see the old or the new snapshot
+        self._state = (rows, stores)
+
+    def _changed(self, table_name):
+        if table_name in self.tables:
+            self.stale = True
+
+    def watch(self):
+        if not self._watching:
+            signals.connect(self._changed)
+            self._watching = True
+
+    def close(self):
+        signals.disconnect(self._changed)
+        self._watching = False
+
+    @property
+    def state(self):
+        if self.stale or self._state is None:
+            self.refresh()
+        return self._state
+
+    def _reduce(self, store, mask):
+        root = bytearray(self.state[1][()].size)
+        for owner in compress(store.owners, mask):
+            root[owner] = 1
+        return root
+
+    @staticmethod
+    def _ones(size):
+        return int.from_bytes(b"\x01" * size, "little")
+
+    def _evaluate(self, node, path=()):
+        stores = self.state[1]
+        if node.path != path:
+            scope = Group(node.op, node.children, node.path) if type(node) == Group else node
+            mask = self._evaluate_in(scope, node.path)
+            return int.from_bytes(self._reduce(stores[node.path], mask), "little")
+        return int.from_bytes(self._evaluate_in(node, path), "little")
+
+    def _evaluate_in(self, node, path):
+        store = self.state[1][path]
+        if type(node) == Predicate:
+            return store.predicate(node)
+
+        masks = [self._evaluate(i, path) for i in node.children]
+        if node.op == "not":
+            mask = masks[0] ^ self._ones(store.size)
+        elif node.op == "or":
+            mask = 0
+            for i in masks:
+                mask |= i
+        else:
+            mask = self._ones(store.size)
+            for i in masks:
+                mask &= i
+        return mask.to_bytes(store.size, "little")
+
+    def filter(self, *nodes):
+        rows, stores = self.state
+        grouped, paths = [], {}
+        for node in nodes:
+            if type(node) == Predicate and node.path:
+                paths.setdefault(node.path, []).append(node)
+            else:
+                grouped.append(node)
+        grouped += [Group("and", i, path) for path, i in paths.items()]
+
+        mask = self._ones(len(rows))
+        for node in grouped:
+            mask &= self._evaluate(node)
+        return MemoryResult(list(compress(rows, mask.to_bytes(len(rows), "little"))))
+
+class MemoryResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return list(self.rows)
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def count(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+class MemoryFilterSet(FilterSet):
+    # The same Meta.fields plan evaluated against a Snapshot:
+    #   snapshot = Snapshot.for_filterset(CategoryFilter, Session, watch=True)
+    #   CategoryFilter(params, snapshot).qs.all()
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for key, field in cls._plan.items():
+            if field.op == "search":
+                raise FilterFieldError(f"'{key}': search is not available in memory")
+
+    def _advance_filter(self, field):
+        return field
+
+    def _in_clause(self, field, value_list, negate=False):
+        return Predicate(field, "in", value_list, negate)
+
+    def _constrain_filter(self, field, column, value_list):
+        if field.op is None or field.op in IN_OPERATIONS or field.op == "ne":
+            return super()._constrain_filter(field, field, value_list)
+
+        value_list = self._coerce(field, value_list)
+        return tuple(Predicate(field, field.op, (value,)) for value in value_list)
+
+    def _exists_filter(self, path, clauses):
+        return Group("and", clauses, tuple(attr.key for attr in path))
+
+    def _leaf_clause(self, leaf:Leaf):
+        field = self._plan[leaf.key]
+        value_list = [value for value in leaf.values if value is not None and value != ""]
+        if not value_list:
+            self._errors.append({self._expression_param:f"'{leaf.key}' has no value"})
+            return None
+        self._check_in_size(leaf.key, value_list)
+        return Group("and", self._constrain_filter(field, field, value_list), field.relation_path)
+
+    def _expression_clause(self, node):
+        if type(node) == Leaf:
+            return self._leaf_clause(node)
+
+        clauses = [self._expression_clause(i) for i in node.children]
+        if any(i is None for i in clauses):
+            return None
+        return Group(node.op, clauses)
+
+    def _sort(self, result):
+        param = self._ordering_param
+        ordering = parse_ordering(self._params.getlist(param) if param and self._ordering_plan else ())
+        ordering = ordering or parse_ordering(self._default_ordering)
+        if not ordering:
+            return result
+
+        errors = [
+            {param:f"'{key}' is not an ordering field"}
+            for key, _ in ordering
+            if key not in self._ordering_plan or self._ordering_plan[key].path
+        ]
+        if errors:
+            raise FilterValidationError(errors)
+
+        rows = result.all()
+        # rows arrive in primary key order, stable sorts keep it as tie breaker
+        for key, descending in reversed(ordering):
+            name = self._ordering_plan[key].name
+            rows.sort(key=lambda i: (getattr(i, name) is not None, getattr(i, name)), reverse=descending)
+        return MemoryResult(rows)
+
+    @property
+    def qs(self):
+        return self._sort(self._filtered())
+
+    def all(self, session=None):
+        return self.qs.all()
+
+    def first(self, session=None):
+        return self.qs.first()
+
+    def scalars(self, session=None):
+        return self.qs.all()
@@ -0,0 +1,73 @@
+from types import MappingProxyType
+from sqlalchemy import inspect
+from bjs_sqlalchemy.filters.plan import FilterFieldError, compile_field
+
+class OrderingIndexWarning(UserWarning):
+    pass
+
+def compile_ordering(model, fields):
+    plan = {}
+    for key in fields:
+        field = compile_field(model, key)
+        if field.op is not None:
+            raise FilterFieldError(f"'{key}': ordering fields cannot use an operator")
+        if any(attr.property.uselist for attr in field.path):
+            # the join repeats the row once per related row, counts and
+            # pages would be off
+            raise FilterFieldError(
+                f"'{key}': ordering fields cannot follow a to-many relationship"
+            )
+        plan[key] = field
+    return MappingProxyType(plan)
+
+def parse_ordering(values):
+    # ?ordering=-name,address__name -> [("name", True), ("address__name", False)]
+    data = []
+    values = [values] if type(values) == str else values
+    for value in values:
+        for key in str(value).split(","):
+            key = key.strip()
+            if not key:
+                continue
+            descending = key.startswith("-")
+            key = key.lstrip("-+").strip()
+            if key and key not in [i[0] for i in data]:
+                data.append((key, descending))
+    return data
+
+def primary_key(entity):
+    info = inspect(entity, raiseerr=False)
+    mapper = getattr(info, "mapper", None)
+    if mapper is None:
+        return []
+    return [getattr(entity, mapper.get_property_by_column(i).key) for i in mapper.primary_key]
+
+def _selects(descriptions, columns):
+    if descriptions[0].get("expr") is descriptions[0].get("entity"):
+        return True
+    exprs = [i.get("expr") for i in descriptions]
+    return all(
+        any(hasattr(j, "compare") and column.expression.compare(j.expression) for j in exprs)
+        for column in columns
+    )
+
+def ordered(queryset):
+    # unordered pages are not deterministic, fall back to the primary key;
+    # not for GROUP BY / DISTINCT or statements that do not select it, an
+    # ORDER BY outside the select list is rejected there
+    if queryset._order_by_clauses or queryset._group_by_clauses or queryset._distinct:
+        return queryset
+    descriptions = queryset.column_descriptions
+    columns = primary_key(descriptions[0].get("entity")) if descriptions else []
+    if not columns or not _selects(descriptions, columns):
+        return queryset
+    return queryset.order_by(*columns)
+
+def index_supports(model, fields):
+    # an index can only serve ORDER BY on the root table, led by the first key
+    from bjs_sqlalchemy.filters.advisor import _filter_column, is_indexed
+
+    if not fields or fields[0].path:
+        return not fields
+    column = _filter_column(fields[0])
+    return column is not None and column.table is model.__table__ and is_indexed(column)
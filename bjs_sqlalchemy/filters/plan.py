@@ -0,0 +1,150 @@
+import operator
+from types import MappingProxyType
+from typing import Any, Callable, NamedTuple, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import RelationshipProperty
+from bjs_sqlalchemy.filters.coercion import get_coercer
+
+class FilterFieldError(ValueError):
+    pass
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+# The pattern is built in Python so the database sees a bound prefix literal,
+# which lets SQLite's LIKE optimisation and btree indexes serve it
+def _startswith(column, value):
+    value = str(value)
+    escaped = _escape_like(value)
+    if escaped == value:
+        return column.like(value + "%")
+    return column.like(escaped + "%", escape="\\")
+
+def _istartswith(column, value):
+    return _startswith(func.lower(column), str(value).lower())
+
+# Operators which accept a list of values and compile to a single IN clause
+IN_OPERATIONS = {
+    "eq": operator.eq,
+    "in": lambda column, value: column.in_(value),
+    "not_in": lambda column, value: column.not_in(value),
+}
+
+NOT_IN_OPERATIONS = {
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "is": lambda column, value: column.is_(value),
+    "icontains": lambda column, value: column.like("%{}%".format(value)),
+    "like": lambda column, value: column.like(value),
+    "ilike": lambda column, value: column.ilike(value),
+    "not_like": lambda column, value: column.notlike(value),
+    "not_ilike": lambda column, value: column.notilike(value),
+    "startswith": _startswith,
+    "istartswith": _istartswith,
+}
+
+OPERATIONS = {**IN_OPERATIONS, **NOT_IN_OPERATIONS}
+
+# full text search compiles through the model's SearchIndex, not a column operator
+SEARCH = "search"
+
+# join: outer join the relationship path (default)
+# exists: correlated EXISTS through relationship.any() / has()
+# auto: EXISTS when the path crosses a one-to-many or many-to-many relationship
+STRATEGIES = ("join", "exists", "auto")
+
+class FilterField(NamedTuple):
+    key: str
+    path: Tuple[Any, ...]
+    model: type
+    name: str
+    attribute: Any
+    op: Optional[str]
+    operator: Callable
+    python_type: Optional[type]
+    strategy: str = "join"
+    coerce: Optional[Callable] = None
+
+    @property
+    def relation_path(self):
+        return tuple(attr.key for attr in self.path)
+
+    def column(self, entity=None):
+        return self.attribute if entity is None else getattr(entity, self.name)
+
+def _python_type(attribute):
+    try:
+        return attribute.property.columns[0].type.python_type
+    except (AttributeError, IndexError, NotImplementedError):
+        return None
+
+def _resolve_strategy(key, path, strategy):
+    if strategy not in STRATEGIES:
+        raise FilterFieldError(
+            f"'{key}': unknown strategy '{strategy}', expected one of {STRATEGIES}"
+        )
+
+    if not path:
+        return "join"
+
+    if strategy == "auto":
+        return "exists" if any(attr.property.uselist for attr in path) else "join"
+
+    return strategy
+
+def _search_operator(model, name, key):
+    index = getattr(model, "__search_index__", None)
+    if index is None or name not in index.columns:
+        raise FilterFieldError(
+            f"'{key}': '{name}' is not part of {model.__name__}.__search_index__"
+        )
+    return index.match
+
+def compile_field(model, key, strategy="join"):
+    parts = key.split("__")
+    op = parts[-1] if len(parts) > 1 and (parts[-1] in OPERATIONS or parts[-1] == SEARCH) else None
+    relation_fields = parts[:-2] if op else parts[:-1]
+    name = parts[-2] if op else parts[-1]
+
+    path = tuple()
+    current = model
+    for i in relation_fields:
+        attr = getattr(current, i, None)
+        prop = getattr(attr, "property", None)
+        if not isinstance(prop, RelationshipProperty):
+            raise FilterFieldError(
+                f"'{key}': '{i}' is not a relationship of {current.__name__}"
+            )
+        path += (attr,)
+        current = prop.mapper.class_
+
+    attribute = getattr(current, name, None)
+    if attribute is None or isinstance(
+        getattr(attribute, "property", None), RelationshipProperty
+    ):
+        raise FilterFieldError(
+            f"'{key}': '{name}' is not a column of {current.__name__}"
+        )
+
+    if op == SEARCH:
+        operator = _search_operator(current, name, key)
+    else:
+        operator = OPERATIONS[op or "eq"]
+
+    python_type = _python_type(attribute)
+    return FilterField(
+        key=key, path=path, model=current, name=name, attribute=attribute,
+        op=op, operator=operator, python_type=python_type,
+        strategy=_resolve_strategy(key, path, strategy),
+        coerce=get_coercer(python_type, op)
+    )
+
+def compile_plan(model, fields, strategy="join", field_strategy=None):
+    field_strategy = field_strategy or {}
+    return MappingProxyType({
+        key: compile_field(model, key, field_strategy.get(key, strategy))
+        for key in fields
+    })
@@ -0,0 +1,65 @@
+from types import MappingProxyType
+from sqlalchemy.orm import (
+    RelationshipProperty, contains_eager, joinedload, selectinload, subqueryload
+)
+from bjs_sqlalchemy.filters.plan import FilterFieldError
+
+LOADERS = {
+    "selectin": selectinload,
+    "joined": joinedload,
+    "subquery": subqueryload,
+}
+
+def compile_relation_path(model, key):
+    path = tuple()
+    current = model
+    for i in key.split("__"):
+        attr = getattr(current, i, None)
+        prop = getattr(attr, "property", None)
+        if not isinstance(prop, RelationshipProperty):
+            raise FilterFieldError(f"'{key}': '{i}' is not a relationship of {current.__name__}")
+        path += (attr,)
+        current = prop.mapper.class_
+    return path
+
+def compile_prefetch(model, paths, default="selectin"):
+    # ("address", ...) or {"address": "joined", ...}
+    items = paths.items() if hasattr(paths, "items") else [(i, default) for i in paths]
+    data = {}
+    for key, strategy in items:
+        if strategy not in LOADERS:
+            raise FilterFieldError(
+                f"'{key}': unknown loader '{strategy}', expected one of {tuple(LOADERS)}"
+            )
+        data[key] = (compile_relation_path(model, key), strategy)
+    return MappingProxyType(data)
+
+def loader_option(path, strategy, strategies=None):
+    # a segment that is loaded on its own keeps its own loader, otherwise
+    # address and address__user with different loaders would conflict
+    strategies = strategies or {}
+    option = None
+    for i, attr in enumerate(path):
+        key = "__".join(j.key for j in path[:i+1])
+        loader = LOADERS[strategies.get(key, strategy)]
+        option = loader(attr) if option is None else getattr(option, loader.__name__)(attr)
+    return option
+
+def joined_option(path, joins):
+    # many-to-one paths already joined for filtering are populated from that
+    # join; a filtered collection join would hand back partial collections
+    if any(attr.property.uselist for attr in path):
+        return None
+
+    keys = tuple(attr.key for attr in path)
+    if keys not in joins:
+        return None
+
+    option = None
+    parent = joins.model
+    for i, attr in enumerate(path):
+        entity = joins.get(keys[:i+1])
+        relation = getattr(parent, attr.key).of_type(entity)
+        option = contains_eager(relation) if option is None else option.contains_eager(relation)
+        parent = entity
+    return option
@@ -0,0 +1,23 @@
+from types import MappingProxyType
+from sqlalchemy.orm import ColumnProperty
+from bjs_sqlalchemy.filters.plan import FilterFieldError
+
+def _column_attribute(model, key):
+    attribute = getattr(model, key, None)
+    if not isinstance(getattr(attribute, "property", None), ColumnProperty):
+        raise FilterFieldError(f"'{key}' is not a column of {model.__name__}")
+    return attribute
+
+def compile_projection(model, fields):
+    return MappingProxyType({key:_column_attribute(model, key) for key in fields})
+
+def parse_fields(values):
+    # ?fields=id,name&fields=age -> ["id", "name", "age"]
+    data = []
+    values = [values] if type(values) == str else values
+    for value in values:
+        for key in str(value).split(","):
+            key = key.strip()
+            if key and key not in data:
+                data.append(key)
+    return data
@@ -0,0 +1,44 @@
+from sqlalchemy import event
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+
+class StatementCacheStats:
+    # Counts SQLAlchemy compiled cache hits for every statement run on an engine
+    def __init__(self, engine):
+        self.engine = getattr(engine, "sync_engine", engine)
+        self.reset()
+        event.listen(self.engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        cache_hit = getattr(context, "cache_hit", None)
+        if cache_hit == CACHE_HIT:
+            self.hits += 1
+        elif cache_hit == CACHE_MISS:
+            self.misses += 1
+        else:
+            self.uncached += 1
+
+    def reset(self):
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self):
+        return {
+            "hits": self.hits, "misses": self.misses,
+            "uncached": self.uncached, "hit_rate": self.hit_rate,
+        }
+
+    def detach(self):
+        if event.contains(self.engine, "after_cursor_execute", self._after_cursor_execute):
+            event.remove(self.engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.detach()
@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import closing
+from sqlalchemy import func, select
+from bjs_sqlalchemy.filters.advisor import (
+    UNINDEXABLE_OPERATIONS, IndexSuggestion, _filter_column
+)
+
+# Operators a composite index can serve after its equality columns
+RANGE_OPERATIONS = {"lt", "lte", "gt", "gte", "startswith"}
+
+class UsageStore:
+    # A local SQLite file, counts from every process are summed on flush
+    def __init__(self, path="filter_usage.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS usage ("
+                "filterset TEXT, keys TEXT, count INTEGER, last_seen REAL, "
+                "PRIMARY KEY (filterset, keys))"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def add(self, counts):
+        now = time.time()
+        with self._lock, closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO usage (filterset, keys, count, last_seen) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (filterset, keys) DO UPDATE SET "
+                "count = count + excluded.count, last_seen = excluded.last_seen",
+                [(name, ",".join(keys), count, now) for (name, keys), count in counts.items()]
+            )
+            conn.execute("COMMIT")
+
+    def counts(self):
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT filterset, keys, count FROM usage").fetchall()
+        return Counter({(name, tuple(keys.split(","))):count for name, keys, count in rows})
+
+    def clear(self):
+        with self._lock, closing(self._connect()) as conn:
+            conn.execute("DELETE FROM usage")
+
+class FilterUsage:
+    # Counters live in a plain per-process Counter. record() takes no lock,
+    # flush() swaps the Counter out in one assignment and writes the old one
+    def __init__(self, store=None, flush_interval=60):
+        self.store = store
+        self.flush_interval = flush_interval
+        self._counts = Counter()
+        self._flushed = Counter()
+        self._next_flush = time.monotonic() + flush_interval
+
+    @staticmethod
+    def name(filterset):
+        return f"{filterset.__module__}.{filterset.__qualname__}"
+
+    def record(self, filterset, keys):
+        if not keys:
+            return
+        self._counts[(self.name(filterset), tuple(sorted(set(keys))))] += 1
+
+        if self.store is not None and time.monotonic() >= self._next_flush:
+            self.flush()
+
+    def flush(self):
+        counts, self._counts = self._counts, Counter()
+        self._next_flush = time.monotonic() + self.flush_interval
+        if not counts:
+            return
+        if self.store is None:
+            self._flushed.update(counts)
+        else:
+            self.store.add(counts)
+
+    def counts(self):
+        self.flush()
+        if self.store is None:
+            return Counter(self._flushed)
+        return self.store.counts()
+
+    def clear(self):
+        self._counts = Counter()
+        self._flushed = Counter()
+        if self.store is not None:
+            self.store.clear()
+
+    @staticmethod
+    def _selectivity(session, table, columns):
+        # distinct combinations / rows, 1.0 means every row is unique
+        distinct = select(*[table.c[i] for i in columns]).distinct().subquery()
+        rows = session.execute(select(func.count()).select_from(table)).scalar()
+        if not rows:
+            return None
+        values = session.execute(select(func.count()).select_from(distinct)).scalar()
+        return values / rows
+
+    @staticmethod
+    def _columns(filterset, keys):
+        tables = {}
+        for key in keys:
+            field = filterset._plan.get(key)
+            column = _filter_column(field) if field else None
+            if column is None or field.op in UNINDEXABLE_OPERATIONS:
+                continue
+            kind = "range" if field.op in RANGE_OPERATIONS else "equality"
+            data = tables.setdefault(column.table, {"equality":[], "range":[]})
+            if column.name not in data["equality"] + data["range"]:
+                data[kind].append(column.name)
+        return tables
+
+    @staticmethod
+    def _is_covered(table, columns):
+        for index in table.indexes:
+            names = [getattr(i, "name", None) for i in index.expressions]
+            if names[:len(columns)] == list(columns):
+                return True
+
+        primary_key = [i.name for i in table.primary_key.columns]
+        return primary_key[:len(columns)] == list(columns)
+
+    def report(self, filtersets=None, session=None, min_count=1):
+        from bjs_sqlalchemy.filters import registry
+
+        classes = {self.name(i):i for i in filtersets or registry}
+        data = []
+
+        for (name, keys), count in self.counts().items():
+            filterset = classes.get(name)
+            if filterset is None or count < min_count:
+                continue
+
+            for table, kinds in self._columns(filterset, keys).items():
+                selectivity = {}
+                if session is not None:
+                    for i in kinds["equality"]:
+                        selectivity[i] = self._selectivity(session, table, (i,)) or 0
+                # most selective equality column first, one range column last
+                columns = sorted(kinds["equality"], key=lambda i: -selectivity.get(i, 0))
+                columns = tuple(columns + kinds["range"][:1])
+                if self._is_covered(table, columns):
+                    continue
+
+                data.append({
+                    "filterset":name, "keys":keys, "count":count,
+                    "table":table.name, "columns":columns,
+                    "selectivity":self._selectivity(session, table, columns) if session is not None else None,
+                    "suggestion":IndexSuggestion(
+                        table.name, columns, None, (f"used {count} times: {', '.join(keys)}",), table
+                    ),
+                })
+
+        return sorted(data, key=lambda i: (-i["count"], -(i["selectivity"] or 0)))
@@ -1,4 +1,5 @@
 from .fields import CharField, IntegerField, BooleanField, FileField, TextField
 from .base_models import Model, Base
+from .search import SearchIndex
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
\ No newline at end of file
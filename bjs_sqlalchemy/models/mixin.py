@@ -3,6 +3,7 @@ from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from sqlalchemy.orm.collections import InstrumentedList
 from .fields import File
 from sqlalchemy.orm.attributes import get_history
+from . import signals
 
 class TableFieldCheck:
     __common_fields = [
@@ -29,6 +30,10 @@ class TableFieldCheck:
             return False
  
 
+class TableChangeSignal:
+    def _table_changed(self):
+        signals.table_changed(self.__class__.__table__.name)
+
 class HandleRemoveFile:
     def _file_remove_handle(self, data):
         for key, value in data.items():
@@ -159,7 +164,7 @@ class DeleteMethodRemoveFile(TableFieldCheck, HandleRemoveFile):
 
 
 # MODELS CRUD MIXIN #
-class CreateMixin(FieldValidation, HandleRemoveFile):
+class CreateMixin(FieldValidation, HandleRemoveFile, TableChangeSignal):
 
     def create(self, session, refresh=True):
         status, data = self._validate_data
@@ -171,11 +176,12 @@ class CreateMixin(FieldValidation, HandleRemoveFile):
             session.commit()
             if refresh:
                 session.refresh(self)
-            return True, self
         except (SQLAlchemyError, IntegrityError, Exception) as e:
             session.rollback()
             self._file_remove_handle(data)
             return False, [str(e)]
+        self._table_changed()
+        return True, self
         
     def bulk_create(self, session, data:list=[]):
         if not data:
@@ -188,6 +194,7 @@ class CreateMixin(FieldValidation, HandleRemoveFile):
             session.rollback()
             return False, str(e)
         session.close()
+        self._table_changed()
         return True, result.lastrowid
 
     async def _async_create(self, session, refresh=True):
@@ -210,9 +217,11 @@ class CreateMixin(FieldValidation, HandleRemoveFile):
             status, output_data =  False, [str(e)]
         
         await session.close()
+        if status:
+            self._table_changed()
         return status, output_data
         
-class UpdateMixin(FieldValidation, UpdateMethodRemoveFile, HandleRemoveFile):
+class UpdateMixin(FieldValidation, UpdateMethodRemoveFile, HandleRemoveFile, TableChangeSignal):
     def update(self, session, **_):
         status, data = self._validate_data
         if not status:
@@ -228,11 +237,12 @@ class UpdateMixin(FieldValidation, UpdateMethodRemoveFile, HandleRemoveFile):
 
             session.close()
             self._file_remove_handle(old_data)
-            return True, self
         except (SQLAlchemyError, IntegrityError, Exception) as e:
             self._file_remove_handle(data)
             session.rollback()
             return False, [str(e)]
+        self._table_changed()
+        return True, self
 
     async def _async_update(self, session, **_):
         status, data = await self._async_validate_data
@@ -258,6 +268,8 @@ class UpdateMixin(FieldValidation, UpdateMethodRemoveFile, HandleRemoveFile):
             status, output_data  = False, [str(e)]
         
         await session.close()
+        if status:
+            self._table_changed()
         return status, output_data
 
     def bulk_update(self, session, data:list=[]):
@@ -267,24 +279,26 @@ class UpdateMixin(FieldValidation, UpdateMethodRemoveFile, HandleRemoveFile):
         try:
             session.bulk_update_mappings(self.__class__, data)
             session.commit()
-            return True, [i["id"] for i in data]
         except (SQLAlchemyError, IntegrityError, Exception) as e:
             session.rollback()
             return False, str(e)
+        self._table_changed()
+        return True, [i["id"] for i in data]
     
-class DeleteMixin(DeleteMethodRemoveFile):
+class DeleteMixin(DeleteMethodRemoveFile, TableChangeSignal):
     def delete(self, session):
         self._delete_method_remove_file_get()
         try:
             session.delete(self)
             session.commit()
             session.close()
-            return True, None
         
         except (SQLAlchemyError, IntegrityError, Exception) as e:
             session.rollback()
             session.close()
             return False, str(e)
+        self._table_changed()
+        return True, None
         
     async def async_delete(self, session):
         try:
@@ -292,12 +306,13 @@ class DeleteMixin(DeleteMethodRemoveFile):
             await session.delete(self)
             await session.commit()
             await session.close()
-            return True, None
         
         except (SQLAlchemyError, IntegrityError, Exception) as e:
             await session.rollback()
             await session.close()
             return False, str(e)
+        self._table_changed()
+        return True, None
         
     def bulk_delete(self, session, data:list=[]):
         if not data:
@@ -309,5 +324,6 @@ class DeleteMixin(DeleteMethodRemoveFile):
         
         session.commit()
         session.close()
+        self._table_changed()
         return True, None
 
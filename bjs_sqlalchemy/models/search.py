@@ -0,0 +1,163 @@
+import re
+from sqlalchemy import String, bindparam, func
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+from sqlalchemy.sql.visitors import InternalTraversal
+from sqlalchemy.types import Boolean, TypeDecorator
+
+def _tokens(value):
+    return [i for i in re.split(r"\s+", str(value).strip()) if i]
+
+def fts5_query(value):
+    # every token becomes a quoted prefix phrase, so user input can never
+    # produce an FTS5 syntax error; input without tokens is rejected by the
+    # filter layer, an empty MATCH is one
+    return " ".join('"{}"*'.format(i.replace('"', '""')) for i in _tokens(value))
+
+def tsquery(value):
+    return " & ".join("'{}':*".format(i.replace("'", "''").replace("\\", "")) for i in _tokens(value))
+
+class SearchQuery(TypeDecorator):
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if dialect.name == "sqlite":
+            return fts5_query(value)
+        if dialect.name == "postgresql":
+            return tsquery(value)
+        return value
+
+class SearchMatch(ColumnElement):
+    type = Boolean()
+    inherit_cache = True
+    _is_implicitly_boolean = True
+    _traverse_internals = [
+        ("column", InternalTraversal.dp_clauseelement),
+        ("pk", InternalTraversal.dp_clauseelement),
+        ("value", InternalTraversal.dp_clauseelement),
+        ("fts_table", InternalTraversal.dp_string),
+        ("config", InternalTraversal.dp_string),
+    ]
+
+    def __init__(self, column, pk, value, fts_table, config):
+        self.column = column.__clause_element__() if hasattr(column, "__clause_element__") else column
+        self.pk = pk.__clause_element__() if hasattr(pk, "__clause_element__") else pk
+        self.value = bindparam(None, value, type_=SearchQuery())
+        self.fts_table = fts_table
+        self.config = config
+
+@compiles(SearchMatch)
+def _compile_search(element, compiler, **kw):
+    expression = func.lower(element.column).contains(func.lower(element.value))
+    return compiler.process(expression, **kw)
+
+@compiles(SearchMatch, "sqlite")
+def _compile_search_sqlite(element, compiler, **kw):
+    quote = compiler.preparer.quote
+    fts_table = quote(element.fts_table)
+    return "{} IN (SELECT rowid FROM {} WHERE {}.{} MATCH {})".format(
+        compiler.process(element.pk, **kw), fts_table, fts_table,
+        quote(element.column.name), compiler.process(element.value, **kw)
+    )
+
+@compiles(SearchMatch, "postgresql")
+def _compile_search_postgresql(element, compiler, **kw):
+    return "to_tsvector('{0}', {1}) @@ to_tsquery('{0}', {2})".format(
+        element.config, compiler.process(element.column, **kw),
+        compiler.process(element.value, **kw)
+    )
+
+class SearchIndex:
+    # Declared on a model as __search_index__ = SearchIndex("name", ...).
+    # SQLite: an external content FTS5 table kept in sync by triggers.
+    # PostgreSQL: one GIN index on to_tsvector(config, column) per column.
+    def __init__(self, *columns, config="english"):
+        self.columns = columns
+        self.config = config
+        self.model = None
+
+    def __set_name__(self, owner, name):
+        self.model = owner
+
+    @property
+    def table(self):
+        return self.model.__table__
+
+    @property
+    def fts_table(self):
+        return f"{self.table.name}_fts"
+
+    @property
+    def _pk(self):
+        return self.table.primary_key.columns.values()[0]
+
+    def match(self, column, value):
+        entity = column.parent.entity if hasattr(column, "parent") else self.model
+        pk = getattr(entity, self._pk.key)
+        return SearchMatch(column, pk, value, self.fts_table, self.config)
+
+    @staticmethod
+    def _connection(bind):
+        return bind.get_bind() if hasattr(bind, "get_bind") else bind
+
+    def _ddl(self, dialect):
+        quote = dialect.identifier_preparer.quote
+        table = quote(self.table.name)
+        fts = quote(self.fts_table)
+        pk = quote(self._pk.name)
+        cols = ", ".join(quote(i) for i in self.columns)
+        new_cols = ", ".join(f"new.{quote(i)}" for i in self.columns)
+        old_cols = ", ".join(f"old.{quote(i)}" for i in self.columns)
+
+        if dialect.name == "sqlite":
+            delete = f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES('delete', old.{pk}, {old_cols});"
+            insert = f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.{pk}, {new_cols});"
+            return [
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content={table}, content_rowid={pk})",
+                f"CREATE TRIGGER IF NOT EXISTS {quote(self.fts_table + '_ai')} AFTER INSERT ON {table} BEGIN {insert} END",
+                f"CREATE TRIGGER IF NOT EXISTS {quote(self.fts_table + '_ad')} AFTER DELETE ON {table} BEGIN {delete} END",
+                f"CREATE TRIGGER IF NOT EXISTS {quote(self.fts_table + '_au')} AFTER UPDATE ON {table} BEGIN {delete} {insert} END",
+            ]
+
+        if dialect.name == "postgresql":
+            return [
+                f"CREATE INDEX IF NOT EXISTS {quote(self._index_name(i))} ON {table} "
+                f"USING gin (to_tsvector('{self.config}', {quote(i)}))"
+                for i in self.columns
+            ]
+
+        return []
+
+    def _index_name(self, column):
+        return f"ix_{self.table.name}_{column}_fts"
+
+    def create(self, bind):
+        engine = self._connection(bind)
+        with engine.begin() as conn:
+            for ddl in self._ddl(conn.dialect):
+                conn.exec_driver_sql(ddl)
+        self.rebuild(engine)
+
+    def rebuild(self, bind):
+        engine = self._connection(bind)
+        with engine.begin() as conn:
+            quote = conn.dialect.identifier_preparer.quote
+            if conn.dialect.name == "sqlite":
+                fts = quote(self.fts_table)
+                conn.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES('rebuild')")
+            elif conn.dialect.name == "postgresql":
+                for i in self.columns:
+                    conn.exec_driver_sql(f"REINDEX INDEX {quote(self._index_name(i))}")
+
+    def drop(self, bind):
+        engine = self._connection(bind)
+        with engine.begin() as conn:
+            quote = conn.dialect.identifier_preparer.quote
+            if conn.dialect.name == "sqlite":
+                for i in ("_ai", "_ad", "_au"):
+                    conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {quote(self.fts_table + i)}")
+                conn.exec_driver_sql(f"DROP TABLE IF EXISTS {quote(self.fts_table)}")
+            elif conn.dialect.name == "postgresql":
+                for i in self.columns:
+                    conn.exec_driver_sql(f"DROP INDEX IF EXISTS {quote(self._index_name(i))}")
@@ -0,0 +1,42 @@
+# Receivers are called with the table name after a CRUD mixin commits a change.
+# Bound methods are held weakly, a ResultCache that is no longer referenced
+# is collected without calling close() and drops out of the list.
+import warnings
+import weakref
+
+_receivers = []
+
+def _ref(receiver):
+    return weakref.WeakMethod(receiver) if hasattr(receiver, "__self__") else (lambda: receiver)
+
+def _live():
+    receivers = []
+    for ref in list(_receivers):
+        receiver = ref()
+        if receiver is None:
+            _receivers.remove(ref)
+        else:
+            receivers.append(receiver)
+    return receivers
+
+def connect(receiver):
+    if receiver not in _live():
+        _receivers.append(_ref(receiver))
+    return receiver
+
+def disconnect(receiver):
+    for ref in list(_receivers):
+        if ref() == receiver:
+            _receivers.remove(ref)
+
+def table_changed(table_name):
+    # the change is committed by now, a failing receiver must not turn it
+    # into a reported failure or keep the other receivers from running
+    for receiver in _live():
+        try:
+            receiver(table_name)
+        except Exception as e:
+            warnings.warn(
+                f"table_changed receiver {receiver!r} failed for '{table_name}': {e}",
+                RuntimeWarning,
+            )
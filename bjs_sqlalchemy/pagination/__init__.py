@@ -1,17 +1,36 @@
 from bjs_sqlalchemy.pagination.mixin import (
-    LimitPageMixin, LimitOffsetMixin
+    CountMixin, CursorMixin, LimitPageMixin, LimitOffsetMixin, ResultCacheMixin
 )
+from bjs_sqlalchemy.proxy_request import to_request_params
+from bjs_sqlalchemy.filters.ordering import ordered
 
-class PageNoPagination(LimitPageMixin):
-    def __init__(self, params, queryset):
+class PageNoPagination(LimitPageMixin, CountMixin, ResultCacheMixin):
+    def __init__(self, params, queryset, cache=None, count_strategy=None):
         self.queryset = queryset
+        self.cache = cache
+        params = to_request_params(params)
         limit = params.get("limit", None)
         page = params.get("page", None)
         self.limit ,self.page_no = self._valid_limit_page(limit, page)
+        self._set_count_strategy(count_strategy)
     
+    def __window_pagination(self):
+        offset = (self.page_no -1) *self.limit
+        rows = self._window_rows(self.limit, offset) if self.page_no >= 1 else []
+        # an empty page carries no count
+        pagination = self.count_strategy.pagination(rows) if rows else self._count()
+        return self._counted_page(pagination, self._page_rows(rows, 1))
+
     def __pagination(self):
-        pagination = {}
-        pagination["count"] = self.queryset.count()
+        if self._windowed():
+            return self.__window_pagination()
+
+        pagination = self._count()
+        if not self._reliable(pagination):
+            offset = (self.page_no -1) *self.limit
+            rows = ordered(self.queryset).limit(self.limit+1).offset(offset).all() if self.page_no >= 1 else []
+            return self._probe_page(pagination, rows)
+
         total_page = pagination["count"] // self.limit
         reminder = pagination["count"] % self.limit
         pagination["total_pages"] = total_page
@@ -28,25 +47,44 @@ class PageNoPagination(LimitPageMixin):
         pagination["previous_page"] = self.page_no -1 if self.page_no > 1 else None
         
         offset = (self.page_no -1) *self.limit
-        query = self.queryset.limit(self.limit).offset(offset).all()
+        query = ordered(self.queryset).limit(self.limit).offset(offset).all()
         data = {"results":query, "pagination":pagination}
         return data
 
-    def main(self):
+    def _main(self):
         if not self.limit:
             return {"results":self.queryset.all()}
         return self.__pagination()
 
-class LimitOffSetPagination(LimitOffsetMixin):
-    def __init__(self, params, queryset):
+    def main(self):
+        if self.cache is not None:
+            return self.cache.fetch(self.queryset, self._main, *self._cache_extra())
+        return self._main()
+
+class LimitOffSetPagination(LimitOffsetMixin, CountMixin, ResultCacheMixin):
+    def __init__(self, params, queryset, cache=None, count_strategy=None):
         self.queryset = queryset
+        self.cache = cache
+        params = to_request_params(params)
         limit = params.get("limit", None)
         offset = params.get("offset", None)
         self.limit ,self.offset = self._valid_limit_offset(limit, offset)
+        self._set_count_strategy(count_strategy)
     
+    def __window_pagination(self):
+        rows = self._window_rows(self.limit, self.offset)
+        pagination = self.count_strategy.pagination(rows) if rows else self._count()
+        return self._counted_offset(pagination, self._page_rows(rows, 1))
+
     def __pagination(self):
-        pagination = {}
-        pagination["count"] = self.queryset.count()
+        if self._windowed():
+            return self.__window_pagination()
+
+        pagination = self._count()
+        if not self._reliable(pagination):
+            rows = ordered(self.queryset).limit(self.limit+1).offset(self.offset).all()
+            return self._probe_offset(pagination, rows)
+
         total_page = pagination["count"] // self.limit
         reminder = pagination["count"] % self.limit
         pagination["total_pages"] = total_page
@@ -64,11 +102,36 @@ class LimitOffSetPagination(LimitOffsetMixin):
         previous_offset = self.offset-self.limit if self.offset > 0 else 0
         pagination["previous_offset"] = previous_offset if previous_offset>0 else None
 
-        query = self.queryset.limit(self.limit).offset(self.offset).all()
+        query = ordered(self.queryset).limit(self.limit).offset(self.offset).all()
         return {"results":query, "pagination":pagination}
 
-    def main(self):
+    def _main(self):
         if not self.limit:
             return {"results":self.queryset.all()}
         return self.__pagination()
 
+    def main(self):
+        if self.cache is not None:
+            return self.cache.fetch(self.queryset, self._main, *self._cache_extra())
+        return self._main()
+
+
+class CursorPagination(CursorMixin, ResultCacheMixin):
+    def __init__(self, params, queryset, cache=None, secret_key=None):
+        self.queryset = queryset
+        self.cache = cache
+        params = to_request_params(params)
+        self.limit = self._valid_limit(params.get("limit", None))
+        self.cursor = params.get("cursor", None)
+        self.secret_key = secret_key or self.secret_key
+
+    def _main(self):
+        if not self.limit:
+            return {"results":self.queryset.all()}
+        query, backwards = self._cursor_statement()
+        return self._cursor_page(query.all(), backwards)
+
+    def main(self):
+        if self.cache is not None:
+            return self.cache.fetch(self.queryset, self._main, *self._cache_extra())
+        return self._main()
@@ -1,20 +1,54 @@
 
 from bjs_sqlalchemy.pagination.mixin import (
     AsyncPaginationMixin as PaginationMixin, 
-    LimitPageMixin, LimitOffsetMixin
+    CursorMixin, LimitPageMixin, LimitOffsetMixin
 )
+from bjs_sqlalchemy.proxy_request import to_request_params
 
 class PageNoPagination(PaginationMixin, LimitPageMixin):
-    def __init__(self, params, queryset, session):
+    def __init__(self, params, queryset, session, cache=None, count_strategy=None, session_factory=None):
         self.queryset = queryset
+        self.cache = cache
+        params = to_request_params(params)
         limit = params.get("limit", None)
         page = params.get("page", None)
         self.limit ,self.page_no = self._valid_limit_page(limit, page)
+        self._set_count_strategy(count_strategy)
         self.session = session
+        self.session_factory = session_factory or self.session_factory
     
+    async def _concurrent_pagination(self):
+        offset = (self.page_no -1) *self.limit
+        pagination, rows = await self._count_and_fetch(self.limit+1, offset)
+        if not self._reliable(pagination):
+            return self._probe_page(pagination, rows)
+
+        # the page was fetched before the count was known
+        return self._counted_page(pagination, rows)
+
+    async def _window_pagination(self):
+        offset = (self.page_no -1) *self.limit
+        try:
+            rows = await self._window_rows(self.limit, offset) if self.page_no >= 1 else []
+            # an empty page carries no count
+            pagination = self.count_strategy.pagination(rows) if rows else await self._count()
+        finally:
+            await self.session.close()
+        return self._counted_page(pagination, self._page_rows(rows, 1))
+
     async def _pagination(self):
-        pagination = {}
-        pagination["count"] = await self.count()
+        if await self._windowed():
+            return await self._window_pagination()
+
+        if self.session_factory is not None and self.page_no >= 1:
+            return await self._concurrent_pagination()
+
+        pagination = await self._count()
+        if not self._reliable(pagination):
+            offset = (self.page_no -1) *self.limit
+            rows = await self.get_all_data(limit=self.limit+1, offset=offset) if self.page_no >= 1 else []
+            return self._probe_page(pagination, rows)
+
         total_page = pagination["count"] // self.limit
         reminder = pagination["count"] % self.limit
         pagination["total_pages"] = total_page
@@ -38,16 +72,44 @@ class PageNoPagination(PaginationMixin, LimitPageMixin):
 
 class LimitOffSetPagination(PaginationMixin, LimitOffsetMixin):
 
-    def __init__(self, params, queryset, session):
+    def __init__(self, params, queryset, session, cache=None, count_strategy=None, session_factory=None):
         self.queryset = queryset
+        self.cache = cache
+        params = to_request_params(params)
         limit = params.get("limit", None)
         offset = params.get("offset", None)
         self.limit ,self.offset = self._valid_limit_offset(limit, offset)
+        self._set_count_strategy(count_strategy)
         self.session = session
+        self.session_factory = session_factory or self.session_factory
     
+    async def _concurrent_pagination(self):
+        pagination, rows = await self._count_and_fetch(self.limit+1, self.offset)
+        if not self._reliable(pagination):
+            return self._probe_offset(pagination, rows)
+
+        return self._counted_offset(pagination, rows)
+
+    async def _window_pagination(self):
+        try:
+            rows = await self._window_rows(self.limit, self.offset)
+            pagination = self.count_strategy.pagination(rows) if rows else await self._count()
+        finally:
+            await self.session.close()
+        return self._counted_offset(pagination, self._page_rows(rows, 1))
+
     async def _pagination(self):
-        pagination = {}
-        pagination["count"] = await self.count()
+        if await self._windowed():
+            return await self._window_pagination()
+
+        if self.session_factory is not None:
+            return await self._concurrent_pagination()
+
+        pagination = await self._count()
+        if not self._reliable(pagination):
+            rows = await self.get_all_data(limit=self.limit+1, offset=self.offset)
+            return self._probe_offset(pagination, rows)
+
         total_page = pagination["count"] // self.limit
         reminder = pagination["count"] % self.limit
         pagination["total_pages"] = total_page
@@ -68,3 +130,20 @@ class LimitOffSetPagination(PaginationMixin, LimitOffsetMixin):
         query = await self.get_all_data(limit=self.limit, offset=self.offset)
         return {"results":query, "pagination":pagination}
 
+
+class CursorPagination(PaginationMixin, CursorMixin):
+    def __init__(self, params, queryset, session, cache=None, secret_key=None):
+        self.queryset = queryset
+        self.cache = cache
+        params = to_request_params(params)
+        self.limit = self._valid_limit(params.get("limit", None))
+        self.cursor = params.get("cursor", None)
+        self.secret_key = secret_key or self.secret_key
+        self.session = session
+
+    async def _pagination(self):
+        query, backwards = self._cursor_statement()
+        data = await self.session.execute(query)
+        rows = data.unique().all()
+        await self.session.close()
+        return self._cursor_page(rows, backwards)
@@ -0,0 +1,218 @@
+import json
+from sqlalchemy import Table, func, select, text
+from bjs_sqlalchemy.cache import ResultCache
+from bjs_sqlalchemy.filters.explain import Explain
+
+# A strategy returns (count, name), name is the strategy that actually
+# produced the count: an estimate that is not available falls back to
+# another strategy and reports that one. A None count means unknown, the
+# page is then fetched with limit+1 rows to find out about a next page.
+
+EXACT = "exact"
+CACHED = "cached"
+ESTIMATED = "estimated"
+NONE = "none"
+WINDOW = "window"
+
+# counts the out of range checks can rely on
+RELIABLE = (EXACT, CACHED, WINDOW)
+
+def _statement(queryset):
+    return queryset.statement if hasattr(queryset, "statement") else queryset
+
+def count_statement(queryset):
+    # counting over the statement itself keeps its joins, a bare
+    # select_from(model) with the where clause copied over does not
+    subquery = _statement(queryset).order_by(None).subquery()
+    return select(func.count()).select_from(subquery)
+
+def _run(steps, execute):
+    # steps is a generator yielding statements and receiving their results
+    try:
+        statement = next(steps)
+        while True:
+            statement = steps.send(execute(statement))
+    except StopIteration as stop:
+        return stop.value
+
+async def _async_run(steps, execute):
+    try:
+        statement = next(steps)
+        while True:
+            statement = steps.send(await execute(statement))
+    except StopIteration as stop:
+        return stop.value
+
+class CountStrategy:
+    name = None
+
+    def count(self, queryset):
+        raise NotImplementedError
+
+    async def async_count(self, queryset, session):
+        raise NotImplementedError
+
+class ExactCount(CountStrategy):
+    name = EXACT
+
+    def count(self, queryset):
+        return queryset.count(), self.name
+
+    async def async_count(self, queryset, session):
+        result = await session.execute(count_statement(queryset))
+        return result.scalar_one(), self.name
+
+class CachedCount(CountStrategy):
+    # one entry per compiled statement and parameters, that is per filter
+    # signature; dropped after ttl seconds or once the CRUD mixins write
+    name = CACHED
+
+    def __init__(self, ttl=60, backend=None, strategy=None):
+        self.cache = ResultCache(backend, ttl)
+        self.strategy = strategy or ExactCount()
+
+    def count(self, queryset):
+        data = self.cache.fetch(
+            queryset, lambda: {"count":self.strategy.count(queryset)[0]}, self.name
+        )
+        return data["count"], self.name
+
+    async def async_count(self, queryset, session):
+        async def loader():
+            return {"count":(await self.strategy.async_count(queryset, session))[0]}
+        data = await self.cache.async_fetch(queryset, loader, self.name)
+        return data["count"], self.name
+
+    def close(self):
+        self.cache.close()
+
+class EstimatedCount(CountStrategy):
+    # Postgres: pg_class.reltuples for a whole table, the planner's row
+    # estimate (EXPLAIN) otherwise. SQLite: sqlite_stat1 for a whole table,
+    # filtered statements fall back. Both need ANALYZE to have run.
+    name = ESTIMATED
+
+    def __init__(self, fallback=None):
+        self.fallback = fallback or ExactCount()
+
+    @staticmethod
+    def plain_table(statement):
+        froms = statement.get_final_froms()
+        if (
+            len(froms) != 1 or not isinstance(froms[0], Table)
+            or statement.whereclause is not None or statement._having_criteria
+            or statement._group_by_clauses or statement._distinct
+            or statement._limit_clause is not None or statement._offset_clause is not None
+        ):
+            return None
+        return froms[0]
+
+    def _estimate(self, statement, dialect):
+        table = self.plain_table(statement)
+        if dialect.name == "sqlite":
+            if table is None:
+                return None
+            exists = yield text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+            )
+            if exists.first() is None:
+                return None
+            result = yield text("SELECT stat FROM sqlite_stat1 WHERE tbl = :name").bindparams(
+                name=table.name
+            )
+            rows = [int(stat.split()[0]) for stat, in result if stat]
+            return max(rows) if rows else None
+
+        if dialect.name == "postgresql":
+            if table is not None:
+                result = yield text(
+                    "SELECT reltuples FROM pg_class WHERE oid = CAST(:name AS regclass)"
+                ).bindparams(name=table.fullname)
+                rows = result.scalar()
+                # -1 until the table has been analyzed
+                return int(rows) if rows is not None and rows >= 0 else None
+
+            result = yield Explain(statement.order_by(None), format="json")
+            plan = result.scalar()
+            plan = json.loads(plan) if type(plan) == str else plan
+            return int(plan[0]["Plan"]["Plan Rows"])
+        return None
+
+    def count(self, queryset):
+        session = queryset.session
+        statement = _statement(queryset)
+        rows = _run(self._estimate(statement, session.get_bind().dialect), session.execute)
+        if rows is None:
+            return self.fallback.count(queryset)
+        return rows, self.name
+
+    async def async_count(self, queryset, session):
+        statement = _statement(queryset)
+        rows = await _async_run(
+            self._estimate(statement, session.get_bind().dialect), session.execute
+        )
+        if rows is None:
+            return await self.fallback.async_count(queryset, session)
+        return rows, self.name
+
+class NoCount(CountStrategy):
+    name = NONE
+
+    def count(self, queryset):
+        return None, self.name
+
+    async def async_count(self, queryset, session):
+        return None, self.name
+
+class WindowCount(CountStrategy):
+    # count(*) OVER () rides along with the page rows. An empty page carries
+    # no count, that and statements without window support use fallback.
+    name = WINDOW
+
+    def __init__(self, fallback=None):
+        self.fallback = fallback or ExactCount()
+
+    @staticmethod
+    def supported(dialect, queryset):
+        # the window is computed before DISTINCT and would count duplicates
+        if getattr(queryset, "_distinct", False):
+            return False
+        version = dialect.server_version_info or ()
+        if dialect.name == "sqlite":
+            return version >= (3, 25)
+        if dialect.name in ("mysql", "mariadb"):
+            return version >= ((10, 2) if dialect.is_mariadb else (8, 0))
+        return dialect.name in ("postgresql", "mssql", "oracle")
+
+    def page(self, queryset):
+        return queryset.add_columns(func.count().over().label("total_count"))
+
+    def pagination(self, rows):
+        return {"count":rows[0][-1], "count_strategy":self.name}
+
+    def count(self, queryset):
+        return self.fallback.count(queryset)
+
+    async def async_count(self, queryset, session):
+        return await self.fallback.async_count(queryset, session)
+
+STRATEGIES = {
+    EXACT:ExactCount,
+    CACHED:CachedCount,
+    ESTIMATED:EstimatedCount,
+    NONE:NoCount,
+    WINDOW:WindowCount,
+}
+
+_shared = {}
+
+def get_count_strategy(strategy):
+    # "cached" shares one cache across paginations, a fresh one per request
+    # would never hit
+    if strategy is None or isinstance(strategy, CountStrategy):
+        return strategy
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown count strategy '{strategy}', expected one of {tuple(STRATEGIES)}")
+    if strategy not in _shared:
+        _shared[strategy] = STRATEGIES[strategy]()
+    return _shared[strategy]
@@ -0,0 +1,126 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+from sqlalchemy import and_, case, false, literal, or_
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import UnaryExpression
+from bjs_sqlalchemy.filters.coercion import get_coercer
+from bjs_sqlalchemy.filters.ordering import primary_key
+from bjs_sqlalchemy.proxy_request import QueryParamsError
+
+# Without a configured key, cursors are only valid inside this process
+_PROCESS_KEY = os.urandom(32)
+
+class CursorError(QueryParamsError):
+    pass
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _signature(payload, key):
+    key = key.encode() if type(key) == str else (key or _PROCESS_KEY)
+    return hmac.new(key, payload, hashlib.sha256).digest()[:16]
+
+def _json_value(value):
+    return value if value is None or type(value) in (str, int, float, bool) else str(value)
+
+def encode_cursor(values, direction, key=None):
+    payload = json.dumps(
+        {"v":[_json_value(i) for i in values], "d":direction}, separators=(",", ":")
+    ).encode()
+    return f"{_b64encode(payload)}.{_b64encode(_signature(payload, key))}"
+
+def decode_cursor(token, key=None):
+    try:
+        payload, signature = token.split(".")
+        payload = _b64decode(payload)
+        valid = hmac.compare_digest(_b64decode(signature), _signature(payload, key))
+    except (ValueError, TypeError):
+        valid = False
+    if not valid:
+        raise CursorError("Invalid cursor")
+
+    data = json.loads(payload)
+    if data.get("d") not in ("n", "p") or type(data.get("v")) != list:
+        raise CursorError("Invalid cursor")
+    return data["v"], data["d"]
+
+def order_columns(queryset):
+    # [(column, descending)], the primary key is appended as tie breaker
+    columns = []
+    for clause in queryset._order_by_clauses:
+        descending = False
+        while isinstance(clause, UnaryExpression) and clause.modifier is not None:
+            descending = descending or clause.modifier is operators.desc_op
+            clause = clause.element
+        columns.append((clause, descending))
+
+    descriptions = queryset.column_descriptions
+    entity = descriptions[0].get("entity") if descriptions else None
+    for column in primary_key(entity):
+        column = column.expression
+        if not any(column.compare(i) for i, _ in columns):
+            columns.append((column, False))
+    return columns
+
+def coerce_values(columns, values):
+    if len(values) != len(columns):
+        raise CursorError("Invalid cursor")
+
+    data = []
+    for (column, _), value in zip(columns, values):
+        try:
+            coerce = get_coercer(column.type.python_type)
+        except NotImplementedError:
+            coerce = None
+        try:
+            data.append(coerce(value) if coerce and value is not None else value)
+        except ValueError:
+            raise CursorError("Invalid cursor")
+    return data
+
+def _nullable(column):
+    # label and expression columns do not know, treat them as nullable
+    return getattr(column, "nullable", True) is not False
+
+def _nulls_key(column):
+    # NULL sorts after every value on every dialect, whatever its default
+    return case((column.is_(None), 1), else_=0)
+
+def _after(column, value, null, lesser):
+    if null:
+        return column.isnot(None) if lesser else None
+    if lesser:
+        return column < value
+    return or_(column > value, column.is_(None)) if _nullable(column) else column > value
+
+def _equal(column, value, null):
+    return column.is_(None) if null else column == value
+
+def seek_predicate(columns, values, backwards=False):
+    # (a, b) after (x, y) -> a > x OR (a = x AND b > y), per column direction;
+    # = and > are never true for NULL, so NULL (the largest value) is spelled
+    # out with IS NULL / IS NOT NULL
+    clauses = []
+    # bound as literals, a bare True / False only compares with = and !=
+    nulls = [value is None for value in values]
+    values = [literal(value, column.type) for (column, _), value in zip(columns, values)]
+    for i, (column, descending) in enumerate(columns):
+        after = _after(column, values[i], nulls[i], descending != backwards)
+        if after is None:
+            continue
+        equal = [_equal(c, v, n) for (c, _), v, n in zip(columns[:i], values[:i], nulls[:i])]
+        clauses.append(and_(*equal, after))
+    return or_(*clauses) if clauses else false()
+
+def seek_order(columns, backwards=False):
+    order = []
+    for column, descending in columns:
+        keys = [_nulls_key(column), column] if _nullable(column) else [column]
+        order.extend(i.desc() if descending != backwards else i.asc() for i in keys)
+    return order
@@ -1,45 +1,148 @@
-from sqlalchemy.future import select
-from sqlalchemy import func
-from sqlalchemy.sql.elements import BinaryExpression
+import asyncio
+import inspect
+from bjs_sqlalchemy.filters.ordering import ordered
+from bjs_sqlalchemy.pagination.count import (
+    RELIABLE, WINDOW, count_statement, get_count_strategy
+)
+from bjs_sqlalchemy.pagination.cursor import (
+    coerce_values, decode_cursor, encode_cursor, order_columns, seek_order, seek_predicate
+)
 
-class AsyncPaginationMixin:
+class ResultCacheMixin:
+    cache = None
 
-    def __extract_filter(self):
-        filter_query = self.queryset._whereclause
-        if filter_query is None:
-            return []
-        
-        if filter_query.__class__ == BinaryExpression:
-            return (filter_query,)
-        
-        return filter_query.clauses
-        
-    async def count(self):
-        model = self.queryset.column_descriptions[0]['entity']
-        count_query = select(func.count()).select_from(model)
-        filter = self.__extract_filter()
-        count_query = count_query.filter(*filter)
-        count_result = await self.session.execute(count_query)
+    def _cache_extra(self):
+        return (
+            self.__class__.__module__, self.__class__.__name__, self.limit,
+            getattr(self, "page_no", None), getattr(self, "offset", None),
+            getattr(self, "cursor", None), getattr(getattr(self, "count_strategy", None), "name", None)
+        )
+
+    def _page_rows(self, rows, extra):
+        # drop the trailing columns added for pagination; a single entity
+        # comes back as the instance, like Query.all() returns it
+        descriptions = self.queryset.column_descriptions
+        if len(descriptions) == 1 and descriptions[0].get("expr") is descriptions[0].get("entity"):
+            return [row[0] for row in rows]
+        return [tuple(row[:-extra]) for row in rows]
+
+class CountMixin:
+    count_strategy = None
+
+    def _set_count_strategy(self, count_strategy):
+        self.count_strategy = get_count_strategy(count_strategy or self.count_strategy)
+
+    @staticmethod
+    def _reliable(pagination):
+        return pagination.get("count_strategy", "exact") in RELIABLE
+
+    def _total_pages(self, count):
+        return count // self.limit + (1 if count % self.limit else 0)
+
+    def _windowed(self):
+        return getattr(self.count_strategy, "name", None) == WINDOW and self.count_strategy.supported(
+            self.queryset.session.connection().dialect, self.queryset
+        )
+
+    def _window_rows(self, limit, offset):
+        query = ordered(self.count_strategy.page(self.queryset)).limit(limit).offset(offset)
+        return query.all()
+
+    def _count(self):
+        if self.count_strategy is None:
+            return {"count":self.queryset.count()}
+        count, name = self.count_strategy.count(self.queryset)
+        return {"count":count, "count_strategy":name}
+
+async def run_together(*coroutines):
+    # asyncio.gather leaves the others running once one fails; here the first
+    # error cancels the rest and is raised after they have finished, and
+    # cancelling the caller cancels all of them
+    tasks = [asyncio.ensure_future(i) for i in coroutines]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    for task in tasks:
+        if not task.cancelled() and task.exception() is not None:
+            raise task.exception()
+    return [task.result() for task in tasks]
+
+class AsyncPaginationMixin(ResultCacheMixin, CountMixin):
+    # with a session_factory the count runs on a session of its own, so on
+    # a second pooled connection, while the page loads on self.session
+    session_factory = None
+
+    def _page_rows(self, rows, extra):
+        # the same shape get_all_data() returns through scalars()
+        return [row[0] for row in rows]
+
+    async def count(self, session=None):
+        session = session or self.session
+        count_result = await session.execute(count_statement(self.queryset))
         return count_result.scalar_one()
+
+    async def _count(self, session=None):
+        session = session or self.session
+        if self.count_strategy is None:
+            return {"count":await self.count(session)}
+        count, name = await self.count_strategy.async_count(self.queryset, session)
+        return {"count":count, "count_strategy":name}
+
+    async def _windowed(self):
+        if getattr(self.count_strategy, "name", None) != WINDOW:
+            return False
+        connection = await self.session.connection()
+        return self.count_strategy.supported(connection.dialect, self.queryset)
+
+    async def _window_rows(self, limit, offset):
+        query = ordered(self.count_strategy.page(self.queryset)).limit(limit).offset(offset)
+        data = await self.session.execute(query)
+        return data.unique().all()
+
+    async def _own_session_count(self):
+        session = self.session_factory()
+        if inspect.isawaitable(session):
+            session = await session
+        try:
+            return await self._count(session)
+        finally:
+            await session.close()
+
+    async def _count_and_fetch(self, limit, offset):
+        return await run_together(
+            self._own_session_count(), self.get_all_data(limit=limit, offset=offset)
+        )
     
     async def get_all_data(self, limit=None, offset=None):
         query = self.queryset
         if limit:
-            query = query.limit(limit)
+            query = ordered(query).limit(limit)
         
         if offset:
             query = query.offset(offset)
         
-        data = await self.session.execute(query)
-        results = data.scalars().all()
-        await self.session.close()
-        return results
+        try:
+            data = await self.session.execute(query)
+            # unique() is required once a joinedload() collection is involved
+            return data.scalars().unique().all()
+        finally:
+            await self.session.close()
 
-    async def main(self):
+    async def _main(self):
         if not self.limit:
             return {"results": await self.get_all_data()}
         return await self._pagination()
 
+    async def main(self):
+        if self.cache is not None:
+            return await self.cache.async_fetch(self.queryset, self._main, *self._cache_extra())
+        return await self._main()
+
 class LimitPageMixin:
     @staticmethod
     def _valid_limit_page(limit, page):
@@ -51,6 +154,26 @@ class LimitPageMixin:
         )
         return limit, page
 
+    def _counted_page(self, pagination, rows):
+        pagination["total_pages"] = self._total_pages(pagination["count"])
+        if not (self.page_no >= 1 and self.page_no <= pagination["total_pages"]):
+            pagination["next_page"] = None
+            pagination["previous_page"] = pagination["total_pages"]
+            return {"results":[], "pagination":pagination}
+
+        pagination["next_page"] = self.page_no+1 if self.page_no < pagination["total_pages"] else None
+        pagination["previous_page"] = self.page_no -1 if self.page_no > 1 else None
+        return {"results":rows[:self.limit], "pagination":pagination}
+
+    def _probe_page(self, pagination, rows):
+        # the count is an estimate or unknown, the extra row of a limit+1
+        # fetch tells whether there is a next page
+        count = pagination["count"]
+        pagination["total_pages"] = None if count is None else self._total_pages(count)
+        pagination["next_page"] = self.page_no+1 if len(rows) > self.limit else None
+        pagination["previous_page"] = self.page_no -1 if self.page_no > 1 else None
+        return {"results":rows[:self.limit], "pagination":pagination}
+
 class LimitOffsetMixin:
     @staticmethod
     def _valid_limit_offset(limit, offset):
@@ -60,4 +183,76 @@ class LimitOffsetMixin:
         offset = offset if type(offset) == int else (
             int(offset) if offset and offset.isdigit() else 0
         )
-        return limit, offset
\ No newline at end of file
+        return limit, offset
+
+    def _counted_offset(self, pagination, rows):
+        pagination["total_pages"] = self._total_pages(pagination["count"])
+        if self.offset < 0 or self.offset > pagination["count"]:
+            pagination["next_offset"] = None
+            pagination["previous_offset"] = pagination["count"]
+            return {"pagination":pagination, "results":[]}
+
+        next_offset = self.offset+self.limit
+        pagination["next_offset"] = next_offset if next_offset < pagination["count"] else None
+        previous_offset = self.offset-self.limit if self.offset > 0 else 0
+        pagination["previous_offset"] = previous_offset if previous_offset>0 else None
+        return {"results":rows[:self.limit], "pagination":pagination}
+
+    def _probe_offset(self, pagination, rows):
+        count = pagination["count"]
+        pagination["total_pages"] = None if count is None else self._total_pages(count)
+        pagination["next_offset"] = self.offset+self.limit if len(rows) > self.limit else None
+        previous_offset = self.offset-self.limit if self.offset > 0 else 0
+        pagination["previous_offset"] = previous_offset if previous_offset>0 else None
+        return {"results":rows[:self.limit], "pagination":pagination}
+
+class CursorMixin:
+    # Keyset pagination over the queryset's ORDER BY plus the primary key.
+    # Ordering columns should be NOT NULL, a NULL cannot be sought past.
+    secret_key = None
+
+    @staticmethod
+    def _valid_limit(limit):
+        return limit if type(limit) == int else (
+            int(limit) if limit and limit.isdigit() else None
+        )
+
+    def _cursor_statement(self):
+        columns = order_columns(self.queryset)
+        query = self.queryset
+        backwards = False
+        self._cursor_values = None
+
+        if self.cursor:
+            values, direction = decode_cursor(self.cursor, self.secret_key)
+            self._cursor_values = coerce_values(columns, values)
+            backwards = direction == "p"
+            query = query.filter(seek_predicate(columns, self._cursor_values, backwards))
+
+        query = query.order_by(None).order_by(*seek_order(columns, backwards))
+        query = query.add_columns(*[column.label(f"cursor_{i}") for i, (column, _) in enumerate(columns)])
+        self._cursor_width = len(columns)
+        return query.limit(self.limit + 1), backwards
+
+    def _cursor_page(self, rows, backwards):
+        more = len(rows) > self.limit
+        rows = list(rows[:self.limit])
+        if backwards:
+            rows.reverse()
+
+        pagination = {"next":None, "previous":None, "limit":self.limit}
+        if rows:
+            width = self._cursor_width
+            first, last = tuple(rows[0][-width:]), tuple(rows[-1][-width:])
+            if more or backwards:
+                pagination["next"] = encode_cursor(last, "n", self.secret_key)
+            if (more and backwards) or (self.cursor and not backwards):
+                pagination["previous"] = encode_cursor(first, "p", self.secret_key)
+        elif self.cursor:
+            # nothing left on this side, point back at where the cursor was
+            direction = "n" if backwards else "p"
+            pagination["next" if backwards else "previous"] = encode_cursor(
+                self._cursor_values, direction, self.secret_key
+            )
+
+        return {"results":self._page_rows(rows, self._cursor_width), "pagination":pagination}
@@ -1,25 +1,152 @@
+from typing import Protocol, runtime_checkable
+from urllib.parse import unquote_plus
+
+class QueryParamsError(ValueError):
+    pass
 
 class ProxyRequest:
-    def __init__(self, params:str=""):
+    max_length = 16384
+    max_keys = 64
+    max_values = 100
+    max_value_length = 8192
+
+    def __init__(
+            self, params:str="", max_length=None, max_keys=None,
+            max_values=None, max_value_length=None
+        ):
+        self.max_length = max_length or self.max_length
+        self.max_keys = max_keys or self.max_keys
+        self.max_values = max_values or self.max_values
+        self.max_value_length = max_value_length or self.max_value_length
+
+        if len(params) > self.max_length:
+            raise QueryParamsError(
+                f"Query string is longer than {self.max_length} characters"
+            )
+
         self.params = params if not params.startswith("?") else params[1:]
-    
-    def getlist(self, key):
-        data = []
-        params = self.params.split("&")
-        for i in params:
-            y = i.split("=")
-            if y[0] == key:
-                if y[1]:
-                    data.append(y[1])
+        self._data = self._parse(self.params)
+
+    def _parse(self, params):
+        data = {}
+        for i in params.split("&"):
+            key, _, value = i.partition("=")
+            if not key:
+                continue
+
+            key = unquote_plus(key)
+            values = data.get(key)
+            if values is None:
+                if len(data) >= self.max_keys:
+                    raise QueryParamsError(
+                        f"Query string has more than {self.max_keys} keys"
+                    )
+                values = data[key] = []
+
+            if not value:
+                continue
+
+            if len(values) >= self.max_values:
+                raise QueryParamsError(
+                    f"'{key}' has more than {self.max_values} values"
+                )
+
+            value = unquote_plus(value)
+            if len(value) > self.max_value_length:
+                raise QueryParamsError(
+                    f"'{key}' value is longer than {self.max_value_length} characters"
+                )
+            values.append(value)
 
         return data
-    
+
+    def getlist(self, key):
+        return list(self._data.get(key, ()))
+
+    def get(self, key, default=None):
+        values = self._data.get(key)
+        return values[-1] if values else default
+
     def keys(self):
-        data = set()
-        params = self.params.split("&")
-        
-        for i in params:
-            y = i.split("=")
-            if y[0]:
-                data.add(y[0])
-        return list(data)
\ No newline at end of file
+        return list(self._data)
+
+@runtime_checkable
+class RequestParams(Protocol):
+    def keys(self): ...
+
+    def getlist(self, key): ...
+
+    def get(self, key, default=None): ...
+
+class MultiDictAdapter:
+    # aiohttp / multidict style objects expose getall() instead of getlist()
+    def __init__(self, data):
+        self._data = data
+
+    def getlist(self, key):
+        return list(self._data.getall(key, ()))
+
+    def get(self, key, default=None):
+        # the last value wins, as with ProxyRequest, Django and Starlette
+        values = self.getlist(key)
+        return values[-1] if values else default
+
+    def keys(self):
+        return self._data.keys()
+
+class MappingAdapter:
+    def __init__(self, data):
+        self._data = data
+
+    def getlist(self, key):
+        value = self._data.get(key)
+        if value is None:
+            return []
+        return list(value) if type(value) in (list, tuple) else [value]
+
+    def get(self, key, default=None):
+        value = self._data.get(key, default)
+        if type(value) in (list, tuple):
+            return value[-1] if value else default
+        return value
+
+    def keys(self):
+        return self._data.keys()
+
+def check_limits(params, limits=ProxyRequest):
+    # the ProxyRequest limits for params a framework has already parsed
+    # multidict keys() repeats a key once per value
+    keys = list(dict.fromkeys(params.keys()))
+    if len(keys) > limits.max_keys:
+        raise QueryParamsError(f"Query string has more than {limits.max_keys} keys")
+
+    for key in keys:
+        values = params.getlist(key)
+        if len(values) > limits.max_values:
+            raise QueryParamsError(f"'{key}' has more than {limits.max_values} values")
+        for value in values:
+            if type(value) == str and len(value) > limits.max_value_length:
+                raise QueryParamsError(
+                    f"'{key}' value is longer than {limits.max_value_length} characters"
+                )
+    return params
+
+def to_request_params(params):
+    if params is None:
+        return MappingAdapter({})
+
+    if type(params) == str:
+        return ProxyRequest(params)
+
+    # ProxyRequest checked its limits while parsing
+    if isinstance(params, ProxyRequest):
+        return params
+
+    # Starlette QueryParams and Django QueryDict are used as is
+    if isinstance(params, RequestParams):
+        return check_limits(params)
+
+    if hasattr(params, "getall"):
+        return check_limits(MultiDictAdapter(params))
+
+    return check_limits(MappingAdapter(params))
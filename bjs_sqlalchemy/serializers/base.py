@@ -13,6 +13,24 @@ class Common:
             if v.__class__.__name__ == "UploadFile":
                 values[k] = pickle.dumps(v)
         return values
+
+    @model_validator(mode='before')
+    def loaded_columns(cls, values):
+        # rows loaded with load_only / defer: read the loaded columns only,
+        # an unloaded column would otherwise be fetched one row at a time
+        state = getattr(values, "_sa_instance_state", None)
+        if state is None:
+            return values
+
+        columns = state.mapper.column_attrs.keys()
+        unloaded = state.unloaded
+        if not any(k in unloaded for k in cls.model_fields if k in columns):
+            return values
+
+        return {
+            k: getattr(values, k) for k in cls.model_fields
+            if not (k in columns and k in unloaded) and hasattr(values, k)
+        }
     
     def _serialize_data(self, instance):
         return self.__class__(**instance.__dict__)
@@ -1,17 +1,22 @@
 from .db_config import AsyncDBSession
 import asyncio
-from sqlalchemy import func
+from sqlalchemy import func, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.future import select
 import unittest
 from .models import (
     Users, Address
 )
-from bjs_sqlalchemy.filters import FilterSet
+from bjs_sqlalchemy.filters import FilterSet, FilterValidationError
 from bjs_sqlalchemy.proxy_request import ProxyRequest
 from bjs_sqlalchemy import serializers
 from bjs_sqlalchemy.pagination.async_pagination import (
-    PageNoPagination, LimitOffSetPagination
+    PageNoPagination, LimitOffSetPagination, CursorPagination
 )
+from bjs_sqlalchemy.cache import ResultCache
+from bjs_sqlalchemy.pagination.count import CachedCount, CountStrategy
+from bjs_sqlalchemy.pagination.mixin import run_together
+from bjs_sqlalchemy.filters.batch import async_batch, async_fan_out
 
 class UserFilter(FilterSet):
     class Meta:
@@ -148,6 +153,104 @@ class TestAsyncFilter(TestClient):
         await session.close()
 
 
+    async def async_test_explain(self):
+        session = await AsyncDBSession()
+        query = select(self.model)
+        data = await self.user_filter_class(
+            params=self.proxy("?address__name=Kolkata"), queryset=query
+        ).async_explain(session)
+        assert data["dialect"] == "sqlite"
+        assert "JOIN address" in data["sql"]
+        assert data["warnings"][0]["type"] == "full_scan"
+        await session.close()
+
+    async def async_test_select_execution(self):
+        session = await AsyncDBSession()
+        filter_set = self.user_filter_class(
+            params=self.proxy("?id__gt=7"), queryset=select(self.model), session=session
+        )
+        data = await filter_set.all()
+        assert [i.id for i in data] == [8, 9, 10]
+        assert (await filter_set.first()).id == 8
+        assert list(await filter_set.scalars()) == data
+
+        columns = self.user_filter_class(
+            params=self.proxy("?name=Indranil-2"), queryset=select(Users.id, Users.name), session=session
+        )
+        assert [tuple(i) for i in await columns.all()] == [(2, "Indranil-2")]
+        assert tuple(await columns.first()) == (2, "Indranil-2")
+        await session.close()
+
+    async def async_test_prefetch(self):
+        session = await AsyncDBSession()
+
+        class PrefetchFilter(FilterSet):
+            class Meta:
+                model = Users
+                fields = {"address__name"}
+                prefetch = {"address":"selectin"}
+                includes = {"contact__contact_detail":"joined"}
+
+        filter_set = PrefetchFilter(
+            params=self.proxy("?address__name=Kolkata&include=contact__contact_detail"),
+            queryset=select(self.model), session=session
+        )
+        data = await filter_set.all()
+        # no lazy load, which would fail outside of a greenlet
+        assert [i.name for i in data[0].address] != []
+        assert [j.contact_detail for j in data[0].contact] is not None
+
+        pagination = LimitOffSetPagination({"limit":5}, filter_set.qs, session=session)
+        data = await pagination.main()
+        assert len(data["results"][0].address) > 0
+
+    async def async_test_batch(self):
+        session = await AsyncDBSession()
+        data = await async_batch(session, [
+            (self.user_filter_class, "?id__gt=7"),
+            (self.user_filter_class, "?address__name=Kolkata"),
+        ])
+        assert [[i.id for i in rows] for rows in data] == [[8, 9, 10], [9]]
+        await session.close()
+
+        data = await async_fan_out(AsyncDBSession, {
+            "gt":(self.user_filter_class, "?id__gt=7"),
+            "lt":(self.user_filter_class, "?id__lt=3"),
+        }, limit=2)
+        assert sorted(i.id for i in data["gt"]) == [8, 9]
+        assert sorted(i.id for i in data["lt"]) == [1, 2]
+
+        # a failing filter cancels the ones still waiting
+        cancelled = []
+        async def factory():
+            if not cancelled:
+                cancelled.append(False)
+                try:
+                    await asyncio.sleep(60)
+                except asyncio.CancelledError:
+                    cancelled[0] = True
+                    raise
+            return await AsyncDBSession()
+        with self.assertRaises(FilterValidationError):
+            await async_fan_out(factory, [
+                (self.user_filter_class, "?id__gt=7"),
+                (self.user_filter_class, "?id__gt=abc"),
+            ])
+        assert cancelled == [True]
+
+    async def async_test_join_filter_execution(self):
+        session = await AsyncDBSession()
+        filter_set = self.user_filter_class(
+            params=self.proxy("?address__name=Kolkata"), queryset=select(self.model)
+        )
+        data = await filter_set.all(session)
+        assert [i.id for i in data] == [9]
+
+        pagination = LimitOffSetPagination({"limit":5}, filter_set.qs, session=session)
+        data = await pagination.main()
+        assert data["pagination"]["count"] == 1
+        assert [i.id for i in data["results"]] == [9]
+
     # async def async_test_count_check(self):
     #     session = await AsyncDBSession() 
     #     query = select(self.model)
@@ -280,6 +383,62 @@ class TestAsyncPageNoPagination(TestClient):
         assert len(srz_data['results']) == 1
         await session.close()
 
+    async def async_test_result_cache(self):
+        cache = ResultCache()
+        for i in range(2):
+            session = await AsyncDBSession()
+            queryset = self.get_filter(params="?name__in=['Indranil-1', 'Indranil-2']", query=select(Users))
+            pagination = PageNoPagination({"limit":1}, queryset=queryset, session=session, cache=cache)
+            data = await pagination.main()
+            assert data['pagination']['count'] == 2
+            assert data['results'][0].name == "Indranil-1"
+            await session.close()
+        assert (cache.misses, cache.hits) == (1, 1)
+        cache.close()
+    async def async_test_count_strategy(self):
+        session = await AsyncDBSession()
+        pagination = PageNoPagination({"limit":4, "page":3}, select(Users), session=session, count_strategy="none")
+        data = await pagination.main()
+        assert [i.id for i in data["results"]] == [9, 10]
+        assert data["pagination"] == {
+            "count":None, "count_strategy":"none", "total_pages":None, "next_page":None, "previous_page":2
+        }
+
+        session = await AsyncDBSession()
+        queryset = self.get_filter(params="?id__gt=4", query=select(Users))
+        pagination = LimitOffSetPagination({"limit":4}, queryset, session=session, count_strategy="estimated")
+        data = await pagination.main()
+        assert data["pagination"]["count_strategy"] == "exact"
+        assert data["pagination"]["count"] == 6
+        assert data["pagination"]["next_offset"] == 4
+
+        strategy = CachedCount()
+        for page in (1, 2):
+            session = await AsyncDBSession()
+            pagination = PageNoPagination({"limit":4, "page":page}, queryset, session=session, count_strategy=strategy)
+            data = await pagination.main()
+            assert data["pagination"]["count"] == 6
+        assert strategy.cache.hits == 1
+        strategy.close()
+    async def async_test_window_count(self):
+        session = await AsyncDBSession()
+        queryset = self.get_filter(params="?id__gt=2", query=select(Users))
+        data = await PageNoPagination({"limit":3, "page":3}, queryset, session=session, count_strategy="window").main()
+        assert [i.id for i in data["results"]] == [9, 10]
+        assert data["pagination"] == {
+            "count":8, "count_strategy":"window", "total_pages":3, "next_page":None, "previous_page":2
+        }
+
+        session = await AsyncDBSession()
+        data = await PageNoPagination({"limit":3, "page":5}, queryset, session=session, count_strategy="window").main()
+        assert data["results"] == []
+        assert data["pagination"]["count_strategy"] == "exact" and data["pagination"]["previous_page"] == 3
+
+        session = await AsyncDBSession()
+        data = await LimitOffSetPagination({"limit":5, "offset":5}, queryset, session=session, count_strategy="window").main()
+        assert [i.id for i in data["results"]] == [8, 9, 10]
+        assert data["pagination"]["count"] == 8 and data["pagination"]["previous_offset"] is None
+
 class TestLimitOffSetPagination(TestClient):
     model = Users
     proxy = ProxyRequest
@@ -349,3 +508,140 @@ class TestLimitOffSetPagination(TestClient):
         assert srz_data['pagination']['count'] == 1
         assert len(srz_data['results']) == 1
 
+class TestCursorPagination(TestClient):
+    model = Users
+    proxy = ProxyRequest
+    filter_class = UserFilter
+    serializer_class = UserSerializer
+    list_pagination_serializer = serializers.ListPaginationSerializer(serializer_class)
+
+    async def async_test_forward_backward(self):
+        ids, params = [], {"limit":4}
+        while True:
+            session = await AsyncDBSession()
+            data = await CursorPagination(params, select(Users), session=session, secret_key="secret").main()
+            ids.append([i.id for i in data["results"]])
+            if not data["pagination"]["next"]:
+                break
+            previous = data["pagination"]["previous"]
+            params = {"limit":4, "cursor":data["pagination"]["next"]}
+        assert ids == [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10]]
+
+        session = await AsyncDBSession()
+        params = {"limit":4, "cursor":previous}
+        data = await CursorPagination(params, select(Users), session=session, secret_key="secret").main()
+        assert [i.id for i in data["results"]] == [1, 2, 3, 4]
+        assert data["pagination"]["previous"] is None
+
+    async def async_test_filter_serializer(self):
+        session = await AsyncDBSession()
+        queryset = self.get_filter(params="?name__icontains=indranil", query=select(Users).order_by(Users.name.desc()))
+        data = await CursorPagination({"limit":3}, queryset, session=session).main()
+        srz_data = self.list_pagination_serializer(**data).model_dump()
+        assert [i["name"] for i in srz_data["results"]] == ["Indranil-9", "Indranil-8", "Indranil-7"]
+        assert srz_data["pagination"]["next"]
+
+        session = await AsyncDBSession()
+        params = {"limit":3, "cursor":data["pagination"]["next"]}
+        data = await CursorPagination(params, queryset, session=session).main()
+        assert [i.name for i in data["results"]] == ["Indranil-6", "Indranil-5", "Indranil-4"]
+
+class SlowCount(CountStrategy):
+    name = "slow"
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.cancelled = False
+
+    async def async_count(self, queryset, session):
+        self.started.set()
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+class TestConcurrentPagination(TestClient):
+    def session_factory(self):
+        self.sessions = getattr(self, "sessions", [])
+        async def open_session():
+            session = await AsyncDBSession()
+            self.sessions.append(session)
+            return session
+        return open_session
+
+    async def async_test_same_results(self):
+        factory = self.session_factory()
+        cases = [
+            (PageNoPagination, {"limit":3, "page":2}),
+            (PageNoPagination, {"limit":3, "page":4}),
+            (PageNoPagination, {"limit":3, "page":9}),
+            (LimitOffSetPagination, {"limit":4, "offset":8}),
+            (LimitOffSetPagination, {"limit":4, "offset":30}),
+        ]
+        for pagination_class, params in cases:
+            for count_strategy in (None, "none"):
+                queryset = select(Users)
+                session = await AsyncDBSession()
+                expected = await pagination_class(params, queryset, session=session, count_strategy=count_strategy).main()
+                # out of range pages return before the sequential path closes it
+                await session.close()
+                data = await pagination_class(
+                    params, queryset, session=await AsyncDBSession(), count_strategy=count_strategy, session_factory=factory
+                ).main()
+                assert data["pagination"] == expected["pagination"]
+                assert [i.id for i in data["results"]] == [i.id for i in expected["results"]]
+
+    async def async_test_runs_concurrently(self):
+        ready = asyncio.Event()
+        async def first():
+            await ready.wait()
+            return 1
+        async def second():
+            ready.set()
+            return 2
+        assert await asyncio.wait_for(run_together(first(), second()), 1) == [1, 2]
+
+    async def async_test_error_cancels_page(self):
+        cancelled = asyncio.Event()
+        async def page():
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        async def count():
+            raise ValueError("count failed")
+        with self.assertRaises(ValueError):
+            await run_together(page(), count())
+        assert cancelled.is_set()
+
+        # a failing page query cancels the count still running beside it
+        factory = self.session_factory()
+        strategy = SlowCount()
+        queryset = select(Users).where(text("no_such_column = 1"))
+        pagination = PageNoPagination(
+            {"limit":3}, queryset, session=await AsyncDBSession(),
+            count_strategy=strategy, session_factory=factory
+        )
+        with self.assertRaises(OperationalError):
+            await pagination.main()
+        assert strategy.started.is_set() and strategy.cancelled
+
+    async def async_test_cancel(self):
+        factory = self.session_factory()
+        strategy = SlowCount()
+        pagination = LimitOffSetPagination(
+            {"limit":3}, select(Users), session=await AsyncDBSession(),
+            count_strategy=strategy, session_factory=factory
+        )
+        task = asyncio.ensure_future(pagination.main())
+        await strategy.started.wait()
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        assert strategy.cancelled
+        # the count session is given back to the pool
+        assert all(session.sync_session._transaction is None for session in self.sessions)
+
@@ -16,6 +16,7 @@ class NameMixin:
 
 class Users(Base, NameMixin):
     __tablename__ = 'users'
+    __search_index__ = models.SearchIndex("name")
     age = Column(Integer)
     address = relationship("Address", back_populates="user")
     contact = relationship("Contact", back_populates="user")
@@ -38,5 +39,11 @@ class ContactDetail(Base):
     contact_type = Column(String)
     contact = relationship(Contact, back_populates="contact_detail")
 
+class Category(Base, NameMixin):
+    __tablename__ = 'category'
+    parent_id = Column(Integer, ForeignKey('category.id'))
+    parent = relationship("Category", remote_side="Category.id", back_populates="children")
+    children = relationship("Category", back_populates="parent")
+
 engine = models.create_engine(DATABASE_URL)
 models.Base.metadata.create_all(engine)
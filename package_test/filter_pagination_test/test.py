@@ -1,15 +1,45 @@
 import sys
 import os
+import io
+import contextlib
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from bjs_sqlalchemy.proxy_request import ProxyRequest
+from bjs_sqlalchemy.proxy_request import (
+    ProxyRequest, MappingAdapter, MultiDictAdapter, to_request_params,
+    QueryParamsError
+)
 from .models import(
-    Users, Address, Contact, ContactDetail
+    Users, Address, Contact, ContactDetail, Category
 ) 
 from .db_config import Session
-from bjs_sqlalchemy.filters import FilterSet
-from bjs_sqlalchemy.pagination import PageNoPagination, LimitOffSetPagination
+from bjs_sqlalchemy.filters import FilterSet, FilterFieldError, FilterValidationError
+from bjs_sqlalchemy.filters.statement_cache import StatementCacheStats
+from bjs_sqlalchemy.filters.in_strategies import (
+    PlainIn, ChunkedIn, ValuesIn, ArrayIn, auto_in_strategy
+)
+from sqlalchemy.dialects import mysql, postgresql
+from bjs_sqlalchemy.pagination import PageNoPagination, LimitOffSetPagination, CursorPagination
+from bjs_sqlalchemy.pagination.cursor import CursorError
+from bjs_sqlalchemy.pagination.count import CachedCount, EstimatedCount, WindowCount
 import unittest
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, selectinload
+from bjs_sqlalchemy.cache import ResultCache, MemoryBackend, FileBackend
+from bjs_sqlalchemy.models import signals
+from bjs_sqlalchemy.filters.explain import plan_warnings
+from bjs_sqlalchemy.filters import advisor, registry
+from bjs_sqlalchemy.filters.usage import FilterUsage, UsageStore
+from bjs_sqlalchemy.filters.expression import ExpressionError, parse
+from bjs_sqlalchemy.filters.ordering import OrderingIndexWarning, ordered, parse_ordering
+import warnings
+import tempfile
+import gc
+import weakref
+from sqlalchemy import select, inspect, event, create_engine, text, func
+from sqlalchemy.orm import sessionmaker
+from typing import Optional
+from bjs_sqlalchemy import serializers
+from bjs_sqlalchemy.filters.batch import batch
+from bjs_sqlalchemy.filters.memory import MemoryFilterSet, Predicate, Snapshot, Store
+from types import SimpleNamespace
 
 
 class UserFilter(FilterSet):
@@ -93,6 +123,1263 @@ class ProxyRequestTest(TestClient):
         name_data.sort()
         assert name_data == ['Indranil', 'Indranil2']
 
+    def test_decoded_values(self):
+        request = ProxyRequest(params="?name=Indranil+Swarnakar&q=a%3Db&expr=x=y&e%5Fkey=1")
+        assert request.getlist("name") == ["Indranil Swarnakar"]
+        assert request.getlist("q") == ["a=b"]
+        assert request.getlist("expr") == ["x=y"]
+        assert request.getlist("e_key") == ["1"]
+
+    def test_get(self):
+        request = ProxyRequest(params="?limit=10&page=1&page=2&blank=")
+        assert request.get("limit") == "10"
+        assert request.get("page") == "2"
+        assert request.get("blank") is None
+        assert request.get("missing", 5) == 5
+
+    def test_limits(self):
+        self.assertRaises(QueryParamsError, ProxyRequest, "name=" + "a"*20000)
+        self.assertRaises(QueryParamsError, ProxyRequest, "name=abc", max_length=5)
+        self.assertRaises(
+            QueryParamsError, ProxyRequest, "a=1&b=2&c=3", max_keys=2
+        )
+        self.assertRaises(
+            QueryParamsError, ProxyRequest, "a=1&a=2&a=3", max_values=2
+        )
+        self.assertRaises(
+            QueryParamsError, ProxyRequest, "a=123456", max_value_length=5
+        )
+        request = ProxyRequest("a=1&a=2&b=&b=", max_keys=2, max_values=2)
+        assert request.getlist("a") == ["1", "2"]
+        assert request.getlist("b") == []
+
+    def test_filter_in_limit(self):
+        session = Session()
+        id_list = list(range(UserFilter.max_in_values + 1))
+        params = ProxyRequest(f"id__not_in={id_list}")
+        filter_data = UserFilter(params=params, queryset=session.query(Users))
+        self.assertRaises(QueryParamsError, lambda: filter_data.qs)
+        session.close()
+
+class FakeMultiDict:
+    def __init__(self, items):
+        self._items = items
+
+    def getall(self, key, default=()):
+        data = [v for k, v in self._items if k == key]
+        return data if data else default
+
+    def get(self, key, default=None):
+        data = self.getall(key)
+        return data[0] if data else default
+
+    def keys(self):
+        return [k for k, _ in self._items]
+
+class RequestParamsTest(TestClient):
+    def test_to_request_params(self):
+        request = ProxyRequest("?name=Indranil-1")
+        assert to_request_params(request) is request
+        assert to_request_params("?name=Indranil-1").getlist("name") == ["Indranil-1"]
+        assert type(to_request_params({"limit":1})) == MappingAdapter
+        assert type(to_request_params(FakeMultiDict([]))) == MultiDictAdapter
+        assert to_request_params(None).get("limit") is None
+
+    def test_adapter_limits(self):
+        for params in [
+            {str(i):"1" for i in range(ProxyRequest.max_keys + 1)},
+            {"name":["a"] * (ProxyRequest.max_values + 1)},
+            FakeMultiDict([("name", "a" * (ProxyRequest.max_value_length + 1))]),
+        ]:
+            self.assertRaises(QueryParamsError, to_request_params, params)
+        assert to_request_params({"limit":1, "name":["a", "b"]}).get("name") == "b"
+
+    def test_mapping_adapter(self):
+        params = MappingAdapter({"name":["Indranil-1", "Indranil-3"], "limit":2})
+        assert params.getlist("name") == ["Indranil-1", "Indranil-3"]
+        assert params.getlist("limit") == [2]
+        assert params.getlist("page") == []
+        assert params.get("name") == "Indranil-3"
+        assert params.get("limit") == 2
+
+    def test_multidict_adapter(self):
+        params = MultiDictAdapter(FakeMultiDict([("name", "Indranil-1"), ("name", "Indranil-3")]))
+        assert params.getlist("name") == ["Indranil-1", "Indranil-3"]
+        assert params.getlist("page") == []
+        assert params.get("name") == "Indranil-3"
+        assert params.get("page", 1) == 1
+
+    def test_same_params_for_filter_and_pagination(self):
+        session = Session()
+        params = ProxyRequest("?name=Indranil-1&name=Indranil-3&limit=1&page=2")
+        query = UserFilter(params=params, queryset=session.query(Users)).qs
+        data = PageNoPagination(params=params, queryset=query).main()
+        assert data["pagination"]["count"] == 2
+        assert data["results"][0].name == "Indranil-3"
+
+        params = {"name":["Indranil-1", "Indranil-3"], "limit":1}
+        query = UserFilter(params=params, queryset=session.query(Users)).qs
+        data = LimitOffSetPagination(params=params, queryset=query).main()
+        assert data["pagination"]["count"] == 2
+        session.close()
+
+class FilterPlanTest(TestClient):
+    def test_compiled_plan(self):
+        field = UserFilter._plan["contact__contact_detail__id"]
+        assert field.path == (Users.contact, Contact.contact_detail)
+        assert field.relation_path == ("contact", "contact_detail")
+        assert field.model == ContactDetail
+        assert field.attribute is ContactDetail.id
+        assert field.op is None
+        assert field.python_type == int
+
+        field = UserFilter._plan["name__icontains"]
+        assert field.path == ()
+        assert field.op == "icontains"
+        assert field.python_type == str
+
+    def test_invalid_field(self):
+        def declare(fields):
+            meta = type("Meta", (), {"model":Users, "fields":fields})
+            return type("InvalidFilter", (FilterSet,), {"Meta":meta})
+
+        self.assertRaises(FilterFieldError, declare, {"unknown"})
+        self.assertRaises(FilterFieldError, declare, {"unknown__name"})
+        self.assertRaises(FilterFieldError, declare, {"name__name"})
+        self.assertRaises(FilterFieldError, declare, {"address"})
+        self.assertRaises(FilterFieldError, declare, {"address__unknown__in"})
+        assert declare({"address__name__in"})._plan
+
+class JoinFilter(FilterSet):
+    class Meta:
+        model = Users
+        fields = {
+            "address__name", "address__name__icontains",
+            "address__user__name", "contact__contact_detail__id",
+            "contact__contact_detail__contact_type",
+        }
+
+class CategoryFilter(FilterSet):
+    class Meta:
+        model = Category
+        fields = {"name", "parent__name", "parent__parent__name__icontains"}
+
+class JoinRegistryTest(TestClient):
+    def get_sql(self, filter_class, params, query):
+        return str(filter_class(params=ProxyRequest(params), queryset=query).qs)
+
+    def test_same_path_joined_once(self):
+        session = Session()
+        params = "?address__name=Kolkata&address__name__icontains=kol"
+        sql = self.get_sql(JoinFilter, params, session.query(Users))
+        assert sql.count("JOIN address") == 1
+
+        params = "?contact__contact_detail__id=15&contact__contact_detail__contact_type=a"
+        sql = self.get_sql(JoinFilter, params, session.query(Users))
+        assert sql.count("JOIN contact ") == 1
+        assert sql.count("JOIN contact_detail") == 1
+        session.close()
+
+    def test_repeated_model_is_aliased(self):
+        session = Session()
+        params = "?address__name=Kolkata&address__user__name=Indranil-9"
+        query = JoinFilter(params=ProxyRequest(params), queryset=session.query(Users)).qs
+        sql = str(query)
+        assert sql.count("JOIN address") == 1
+        assert sql.count("JOIN users AS users_1") == 1
+        assert len(query.all()) == 1
+        session.close()
+
+    def test_self_referential_path(self):
+        session = Session()
+        params = "?parent__name=Root&parent__parent__name__icontains=top"
+        sql = self.get_sql(CategoryFilter, params, session.query(Category))
+        assert sql.count("JOIN category AS category_1") == 1
+        assert sql.count("JOIN category AS category_2") == 1
+        assert session.query(Category).count() == 0
+        session.close()
+
+class ExistsFilter(FilterSet):
+    class Meta:
+        model = Users
+        fields = {
+            "address__name", "address__name__icontains",
+            "contact__contact_detail__id", "contact__contact_detail__contact_type",
+        }
+        strategy = "auto"
+
+class ExistsAddressFilter(FilterSet):
+    class Meta:
+        model = Address
+        fields = {"user__name", "user__address__name"}
+        strategy = "auto"
+        field_strategy = {"user__name":"exists"}
+
+class ExistsStrategyTest(TestClient):
+    def test_compiled_strategy(self):
+        assert ExistsFilter._plan["address__name"].strategy == "exists"
+        assert ExistsFilter._plan["contact__contact_detail__id"].strategy == "exists"
+        assert UserFilter._plan["address__name"].strategy == "join"
+        assert ExistsAddressFilter._plan["user__name"].strategy == "exists"
+        assert ExistsAddressFilter._plan["user__address__name"].strategy == "exists"
+        assert AddressFilter._plan["user__name"].strategy == "join"
+
+        meta = type("Meta", (), {"model":Users, "fields":{"name"}, "strategy":"x"})
+        self.assertRaises(FilterFieldError, type, "InvalidFilter", (FilterSet,), {"Meta":meta})
+
+    def test_exists_query(self):
+        session = Session()
+        params = ProxyRequest("?contact__contact_detail__id=15")
+        query = ExistsFilter(params=params, queryset=session.query(Users)).qs
+        sql = str(query)
+        assert "EXISTS" in sql
+        assert "JOIN" not in sql
+        data = query.all()
+        assert len(data) == 1
+        assert data[0].id == 3
+
+        params = ProxyRequest("?user__name=Indranil-9")
+        query = ExistsAddressFilter(params=params, queryset=session.query(Address)).qs
+        assert "JOIN" not in str(query)
+        assert len(query.all()) == 2
+        session.close()
+
+    def test_exists_does_not_multiply_rows(self):
+        session = Session()
+        params = "?address__name__icontains=a"
+        join_query = JoinFilter(params=ProxyRequest(params), queryset=session.query(Users.id)).qs
+        exists_query = ExistsFilter(params=ProxyRequest(params), queryset=session.query(Users.id)).qs
+        join_ids = [i[0] for i in join_query.all()]
+        exists_ids = [i[0] for i in exists_query.all()]
+        assert sorted(set(join_ids)) == sorted(exists_ids)
+        assert len(join_ids) > len(exists_ids)
+        assert exists_query.count() == len(set(join_ids))
+        session.close()
+
+    def test_exists_same_path_single_subquery(self):
+        session = Session()
+        params = "?address__name=Kolkata&address__name__icontains=kol"
+        query = ExistsFilter(params=ProxyRequest(params), queryset=session.query(Users)).qs
+        assert str(query).count("EXISTS") == 1
+        assert len(query.all()) == 1
+        session.close()
+
+class StatementCacheTest(TestClient):
+    def get_sql(self, params, query):
+        return str(UserFilter(params=ProxyRequest(params), queryset=query).qs)
+
+    def test_stable_sql(self):
+        session = Session()
+        query = session.query(Users)
+        assert self.get_sql("?name=Indranil-1", query) == self.get_sql(
+            "?name=Indranil-1&name=Indranil-2&name=Indranil-3", query
+        )
+        assert self.get_sql("?name__in=[1]", query) == self.get_sql(
+            "?name__in=[1, 2, 3, 4]", query
+        )
+        assert self.get_sql("?id__ne=1", query) == self.get_sql(
+            "?id__ne=1&id__ne=2", query
+        )
+        assert self.get_sql("?id__gt=1&name=Indranil-1", query) == self.get_sql(
+            "?name=Indranil-2&id__gt=5", query
+        )
+        session.close()
+
+    def test_cache_hits(self):
+        session = Session()
+        with StatementCacheStats(session.get_bind()) as stats:
+            for params in ("?name=Indranil-1", "?name=Indranil-1&name=Indranil-2",
+                           "?name=Indranil-3&name=Indranil-4&name=Indranil-5"):
+                UserFilter(params=params, queryset=session.query(Users)).qs.all()
+        assert stats.hits + stats.misses == 3
+        assert stats.hits >= 2
+        assert stats.hit_rate >= 2/3
+        assert stats.as_dict()["hits"] == stats.hits
+        session.close()
+
+class LargeInFilter(FilterSet):
+    class Meta:
+        model = Users
+        fields = {"id__in", "id__not_in", "id"}
+        in_threshold = 4
+
+class InStrategyTest(TestClient):
+    def test_auto_strategy(self):
+        assert type(auto_in_strategy("sqlite", 10)) == PlainIn
+        assert type(auto_in_strategy("postgresql", 501)) == ArrayIn
+        strategy = auto_in_strategy("sqlite", 501)
+        assert type(strategy) == ChunkedIn and strategy.literal
+        strategy = auto_in_strategy("oracle", 501)
+        assert type(strategy) == ChunkedIn and not strategy.literal
+
+    def test_strategy_sql(self):
+        dialect = postgresql.dialect()
+        sql = str(ChunkedIn(chunk_size=2)(Users.id, [1, 2, 3]).compile())
+        assert sql.count("IN") == 2 and " OR " in sql
+        sql = str(ChunkedIn(chunk_size=2)(Users.id, [1, 2, 3], negate=True).compile())
+        assert sql.count("NOT IN") == 2 and " AND " in sql
+        sql = str(ArrayIn()(Users.id, [1, 2, 3]).compile(dialect=dialect))
+        assert "= ANY (" in sql
+        sql = str(ArrayIn()(Users.id, [1, 2, 3], negate=True).compile(dialect=dialect))
+        assert "!= ALL (" in sql
+        sql = str(ValuesIn()(Users.id, [1, 2, 3]).compile(dialect=dialect))
+        assert "VALUES" in sql and "IN (SELECT" in sql
+
+    def test_large_in_list(self):
+        session = Session()
+        id_list = list(range(1, 601))
+        query = LargeInFilter(params=f"id__in={id_list}", queryset=session.query(Users)).qs
+        assert " OR " in str(query)
+        assert len(query.all()) == 10
+
+        query = LargeInFilter(params=f"id__not_in={id_list}", queryset=session.query(Users)).qs
+        assert len(query.all()) == 0
+
+        query = LargeInFilter(params={"id":[1, 2, 3, 4, 5, 6]}, queryset=session.query(Users)).qs
+        assert len(query.all()) == 6
+        session.close()
+
+    def test_values_strategy(self):
+        session = Session()
+        meta = type("Meta", (), {"model":Users, "fields":{"id__in", "id__not_in"}, "in_strategy":"values"})
+        filter_class = type("ValuesFilter", (FilterSet,), {"Meta":meta})
+        query = filter_class(params={"id__in":"[2,4,6]"}, queryset=session.query(Users)).qs
+        sql = str(query.statement.compile(dialect=session.get_bind().dialect))
+        assert "IN (SELECT in_values.column1 \nFROM (VALUES (?), (?), (?)) AS in_values)" in sql
+        assert sorted(i.id for i in query.all()) == [2, 4, 6]
+        query = filter_class(params={"id__not_in":"[2,4,6]"}, queryset=session.query(Users)).qs
+        assert sorted(i.id for i in query.all()) == [1, 3, 5, 7, 8, 9, 10]
+        registry.remove(filter_class)
+        session.close()
+
+    def test_invalid_strategy(self):
+        meta = type("Meta", (), {"model":Users, "fields":{"id"}, "in_strategy":"x"})
+        self.assertRaises(FilterFieldError, type, "InvalidFilter", (FilterSet,), {"Meta":meta})
+
+class TypedFilter(FilterSet):
+    class Meta:
+        model = Users
+        fields = {
+            "id", "id__in", "id__gt", "age__lte", "is_deleted",
+            "name__is", "name__icontains", "address__user_id"
+        }
+
+class CoercionTest(TestClient):
+    def get_filter(self, params, query):
+        return TypedFilter(params=ProxyRequest(params), queryset=query).qs
+
+    def test_values_are_typed(self):
+        session = Session()
+        query = self.get_filter("?id=3&id=6&id__gt=1&is_deleted=false", session.query(Users))
+        params = query.statement.compile().params
+        assert sorted(params["id_1"]) == [3, 6]
+        assert params["id_2"] == 1
+        assert params["is_deleted_1"] == [False]
+        assert [i.id for i in query.all()] == [6]
+
+        query = self.get_filter('?id__in=["1", 2, "3"]', session.query(Users))
+        assert query.statement.compile().params["id_1"] == [1, 2, 3]
+        assert len(query.all()) == 3
+
+        query = self.get_filter("?name__is=null", session.query(Users))
+        assert "IS NULL" in str(query)
+        assert len(query.all()) == 0
+        session.close()
+
+    def test_pattern_value_is_not_coerced(self):
+        session = Session()
+        query = self.get_filter("?name__icontains=1", session.query(Users))
+        assert len(query.all()) == 2
+        session.close()
+
+    def test_invalid_values(self):
+        session = Session()
+        with self.assertRaises(FilterValidationError) as error:
+            self.get_filter("?id=abc&id__gt=1.5&is_deleted=maybe&age__lte=3", session.query(Users))
+
+        errors = sorted(error.exception.errors, key=lambda x: list(x.keys())[0])
+        assert errors == [
+            {"id":"'abc' is not a valid integer"},
+            {"id__gt":"'1.5' is not a valid integer"},
+            {"is_deleted":"'maybe' is not a valid boolean"},
+        ]
+
+        with self.assertRaises(FilterValidationError) as error:
+            self.get_filter("?id__in=[1, 'x']&address__user_id=y", session.query(Users))
+        assert len(error.exception.errors) == 2
+        session.close()
+
+class TextFilter(FilterSet):
+    class Meta:
+        model = Users
+        fields = {
+            "name__startswith", "name__istartswith", "name__search",
+            "address__user__name__search"
+        }
+
+class TextOperatorTest(TestClient):
+    @classmethod
+    def setUpClass(cls):
+        session = Session()
+        Users.__search_index__.create(session.get_bind())
+        session.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        session = Session()
+        Users.__search_index__.drop(session.get_bind())
+        session.close()
+
+    def get_filter(self, params, query):
+        return TextFilter(params=ProxyRequest(params), queryset=query).qs
+
+    def test_startswith(self):
+        session = Session()
+        query = self.get_filter("?name__startswith=Indranil-1", session.query(Users))
+        assert "LIKE" in str(query) and "ESCAPE" not in str(query)
+        assert query.statement.compile().params["name_1"] == "Indranil-1%"
+        assert len(query.all()) == 2
+
+        query = self.get_filter("?name__startswith=indranil-1", session.query(Users))
+        assert len(query.all()) == 2
+
+        query = self.get_filter("?name__istartswith=INDRANIL-1", session.query(Users))
+        assert "lower(users.name) LIKE" in str(query)
+        assert len(query.all()) == 2
+
+        query = self.get_filter("?name__startswith=Indranil%1", session.query(Users))
+        assert "ESCAPE" in str(query)
+        assert len(query.all()) == 0
+        session.close()
+
+    def test_search(self):
+        session = Session()
+        query = self.get_filter("?name__search=indranil 10", session.query(Users))
+        assert "users_fts" in str(query.statement.compile(dialect=session.get_bind().dialect))
+        assert [i.name for i in query.all()] == ["Indranil-10"]
+
+        query = self.get_filter('?name__search=indr"', session.query(Users))
+        assert len(query.all()) == 10
+
+        query = self.get_filter("?address__user__name__search=indranil 9", session.query(Users))
+        assert [i.name for i in query.all()] == ["Indranil-9"]
+        session.close()
+
+    def test_search_without_terms(self):
+        for params in ["?name__search=+", "?name__search=%20%09"]:
+            with self.assertRaises(FilterValidationError) as e:
+                TextFilter(params=params, queryset=select(Users)).qs
+            assert "has no search terms" in str(e.exception.errors)
+
+    def test_search_sql(self):
+        query = TextFilter(params="?name__search=indr", queryset=select(Users)).qs
+        sql = str(query.compile(dialect=postgresql.dialect()))
+        assert "to_tsvector('english', users.name) @@ to_tsquery('english'" in sql
+        assert "lower(users.name) LIKE" in str(query)
+
+    def test_search_needs_index(self):
+        meta = type("Meta", (), {"model":Address, "fields":{"name__search"}})
+        self.assertRaises(FilterFieldError, type, "InvalidFilter", (FilterSet,), {"Meta":meta})
+
+class ResultCacheTest(TestClient):
+    def paginate(self, cache, session, params="?limit=2&page=1"):
+        query = UserFilter(params=params, queryset=session.query(Users)).qs
+        return PageNoPagination(params=params, queryset=query, cache=cache).main()
+
+    def test_hit_and_decode(self):
+        session = Session()
+        cache = ResultCache(ttl=60)
+        data = self.paginate(cache, session)
+        cached = self.paginate(cache, session)
+        assert (cache.misses, cache.hits) == (1, 1)
+        assert cached["pagination"] == data["pagination"]
+        assert [i.name for i in cached["results"]] == [i.name for i in data["results"]]
+        assert cached["results"][0] is not data["results"][0]
+
+        self.paginate(cache, session, "?limit=2&page=2")
+        self.paginate(cache, session, "?limit=2&page=1&name=Indranil-1")
+        assert cache.misses == 3
+
+        query = session.query(Users.id, Users.name).filter(Users.id < 3)
+        rows = cache.fetch(query, query.all)
+        assert cache.fetch(query, query.all) == [tuple(i) for i in rows]
+        cache.close()
+        session.close()
+
+    def test_crud_invalidation(self):
+        session = Session()
+        cache = ResultCache()
+        query = session.query(Category)
+        assert LimitOffSetPagination(params={}, queryset=query, cache=cache).main()["results"] == []
+        assert cache.hits == 0
+
+        status, category = Category(name="Cached").save(session)
+        assert status
+        data = LimitOffSetPagination(params={}, queryset=session.query(Category), cache=cache).main()
+        assert cache.hits == 0
+        assert [i.name for i in data["results"]] == ["Cached"]
+
+        data = LimitOffSetPagination(params={}, queryset=session.query(Category), cache=cache).main()
+        assert cache.hits == 1
+        category.delete(session)
+        data = LimitOffSetPagination(params={}, queryset=session.query(Category), cache=cache).main()
+        assert data["results"] == []
+        cache.close()
+        session.close()
+
+    def test_unreferenced_cache(self):
+        cache = ResultCache()
+        count = CachedCount()
+        refs = [weakref.ref(cache), weakref.ref(count.cache)]
+        del cache, count
+        gc.collect()
+        assert [i() for i in refs] == [None, None]
+        signals.table_changed("users")
+        assert all(i() is not None for i in signals._receivers)
+
+    def test_failing_receiver(self):
+        def receiver(table):
+            raise RuntimeError("cache backend locked")
+
+        session = Session()
+        signals.connect(receiver)
+        try:
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always")
+                status, category = Category(name="Receiver").create(session)
+                assert status, category
+                assert session.query(Category).filter(Category.name == "Receiver").count() == 1
+                assert category.delete(session) == (True, None)
+        finally:
+            signals.disconnect(receiver)
+        assert any("cache backend locked" in str(i.message) for i in caught)
+        assert session.query(Category).filter(Category.name == "Receiver").count() == 0
+        session.close()
+
+    def test_memory_backend(self):
+        backend = MemoryBackend(max_entries=2)
+        backend.set("a", b"1", tables=["users"])
+        backend.set("b", b"2", tables=["address"])
+        backend.get("a")
+        backend.set("c", b"3", tables=["users"])
+        assert backend.get("b") is None
+        assert len(backend) == 2
+        backend.invalidate("users")
+        assert len(backend) == 0
+
+        backend.set("a", b"1", ttl=-1)
+        assert backend.get("a") is None
+
+    def test_file_backend(self):
+        with tempfile.TemporaryDirectory() as directory:
+            backend = FileBackend(path=os.path.join(directory, "cache.db"), max_entries=2)
+            backend.set("a", b"1", tables=["users", "address"])
+            backend.set("b", b"2", tables=["address"])
+            assert backend.get("a") == b"1"
+            backend.set("c", b"3", tables=["contact"])
+            assert len(backend) == 2
+            assert backend.get("b") is None
+            backend.invalidate("users")
+            assert backend.get("a") is None
+            assert backend.get("c") == b"3"
+
+            session = Session()
+            cache = ResultCache(backend=backend)
+            self.paginate(cache, session)
+            data = self.paginate(cache, session)
+            assert cache.hits == 1
+            assert len(data["results"]) == 2
+            cache.close()
+            session.close()
+
+class ExplainTest(TestClient):
+    def test_explain(self):
+        session = Session()
+        data = TypedFilter(params="?address__user_id=9", queryset=session.query(Users)).explain()
+        assert data["dialect"] == "sqlite"
+        assert "JOIN address" in data["sql"]
+        assert 9 in data["params"].values()
+        assert data["plan"]
+        assert {"type":"full_scan", "table":"address", "detail":"SCAN address"} in data["warnings"]
+
+        data = UserFilter(params="?id__gt=3", queryset=select(Users)).explain(session)
+        assert data["params"] == {"id_1":3}
+        assert data["warnings"] == []
+        session.close()
+
+    def test_plan_warnings(self):
+        assert plan_warnings("sqlite", [(1, 0, 0, "SCAN TABLE users")])[0]["type"] == "full_scan"
+        assert plan_warnings("sqlite", [(1, 0, 0, "SCAN users USING COVERING INDEX ix")]) == []
+        assert plan_warnings("sqlite", [(1, 0, 0, "USE TEMP B-TREE FOR ORDER BY")])[0]["type"] == "temp_btree"
+
+        plan = [
+            ("Sort  (cost=1.1..1.2 rows=1 width=4)",),
+            ("  ->  Seq Scan on users  (cost=0.00..1.1 rows=1 width=4)",),
+        ]
+        warnings = plan_warnings("postgresql", plan)
+        assert [i["type"] for i in warnings] == ["filesort", "full_scan"]
+        assert warnings[1]["table"] == "users"
+
+        keys = ("id", "table", "type", "Extra")
+        plan = [(1, "users", "ALL", "Using where; Using temporary; Using filesort")]
+        warnings = plan_warnings("mysql", plan, keys)
+        assert [i["type"] for i in warnings] == ["full_scan", "temp_btree", "filesort"]
+
+class IndexAdvisorTest(TestClient):
+    def test_registry(self):
+        assert UserFilter in registry and TextFilter in registry
+        assert FilterSet not in registry
+
+    def test_advise(self):
+        suggestions = advisor.advise([AddressFilter, TextFilter])
+        found = {(i.table, i.columns, i.expression):i for i in suggestions}
+
+        # address.user_id backs the Address.user join, users.id is the primary key
+        assert ("address", ("user_id",), None) in found
+        assert "join: AddressFilter.user__name" in found[("address", ("user_id",), None)].reasons
+        assert ("users", ("id",), None) not in found
+        assert ("users", ("name",), None) in found
+        assert ("users", ("name",), "lower") in found
+
+        suggestion = found[("address", ("user_id",), None)]
+        assert suggestion.ddl(Users.metadata, postgresql.dialect()) == \
+            "CREATE INDEX IF NOT EXISTS ix_address_user_id ON address (user_id);"
+        assert suggestion.alembic() == 'op.create_index("ix_address_user_id", "address", [\'user_id\'])'
+        assert found[("users", ("name",), "lower")].alembic() == \
+            'op.create_index("ix_users_name_lower", "users", [sa.text("lower(name)")])'
+
+    def test_report(self):
+        suggestions = advisor.advise([AddressFilter])
+        text = advisor.report(suggestions)
+        assert "address(user_id)  <- join: AddressFilter.user__name" in text
+        sql = advisor.report(suggestions, "sql", Users.metadata, "sqlite")
+        assert "CREATE INDEX IF NOT EXISTS ix_users_name ON users (name);" in sql
+
+    def test_separate_metadata(self):
+        from sqlalchemy import Column, Integer, String
+        from sqlalchemy.orm import declarative_base
+
+        class Note(declarative_base()):
+            __tablename__ = "note"
+            id = Column(Integer, primary_key=True)
+            title = Column(String)
+
+        class NoteFilter(FilterSet):
+            class Meta:
+                model = Note
+                fields = {"title"}
+        try:
+            sql = advisor.report(advisor.advise([AddressFilter, NoteFilter]), "sql", dialect="sqlite")
+            assert "ix_note_title ON note (title);" in sql
+            assert "ix_users_name ON users (name);" in sql
+            with contextlib.redirect_stdout(io.StringIO()) as output:
+                assert advisor.main([Users.__module__, "--format", "sql"]) == 1
+            assert "ix_note_title ON note (title);" in output.getvalue()
+        finally:
+            registry.remove(NoteFilter)
+
+    def test_same_named_tables(self):
+        from sqlalchemy import Column, Integer, String
+        from sqlalchemy.orm import declarative_base
+
+        def note_filter(schema):
+            class Note(declarative_base()):
+                __tablename__ = "note"
+                __table_args__ = {"schema":schema}
+                id = Column(Integer, primary_key=True)
+                title = Column(String)
+
+            meta = type("Meta", (), {"model":Note, "fields":{"title"}})
+            return type("NoteFilter", (FilterSet,), {"Meta":meta})
+
+        filters = [note_filter(None), note_filter("archive")]
+        try:
+            suggestions = advisor.advise(filters)
+            assert [(i.table, i.source.fullname) for i in suggestions] == [
+                ("note", "archive.note"), ("note", "note")
+            ]
+            assert "ON archive.note (title)" in suggestions[0].ddl()
+        finally:
+            for i in filters:
+                registry.remove(i)
+
+class UsageFilter(FilterSet):
+    class Meta:
+        model = Users
+        usage = FilterUsage()
+        fields = {
+            "is_deleted", "age", "age__gt", "name__icontains", "address__name"
+        }
+
+class FilterUsageTest(TestClient):
+    def test_record(self):
+        session = Session()
+        usage = UsageFilter.Meta.usage
+        usage.clear()
+        name = FilterUsage.name(UsageFilter)
+
+        for _ in range(3):
+            UsageFilter(params="?is_deleted=0&name__icontains=ind&address__name=Kolkata", queryset=session.query(Users)).qs.all()
+        UsageFilter(params="?age=20&age__gt=10&name__icontains=", queryset=session.query(Users)).qs.all()
+
+        counts = usage.counts()
+        assert counts[(name, ("address__name", "is_deleted", "name__icontains"))] == 3
+        assert counts[(name, ("age", "age__gt"))] == 1
+
+        report = usage.report([UsageFilter], session=session)
+        assert [i["count"] for i in report] == [3, 3, 1]
+        assert {(i["table"], i["columns"], i["count"]) for i in report} == {
+            ("address", ("name",), 3), ("users", ("is_deleted",), 3), ("users", ("age",), 1)
+        }
+        users = [i for i in report if i["table"] == "users" and i["count"] == 3][0]
+        assert users["selectivity"] == 0.2
+        assert users["suggestion"].ddl(Users.metadata) == \
+            "CREATE INDEX IF NOT EXISTS ix_users_is_deleted ON users (is_deleted);"
+        usage.clear()
+        session.close()
+
+    def test_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = UsageStore(os.path.join(directory, "usage.db"))
+            first, second = FilterUsage(store), FilterUsage(store, flush_interval=0)
+            first.record(UsageFilter, ["is_deleted"])
+            second.record(UsageFilter, ["is_deleted"])
+            assert store.counts()[(FilterUsage.name(UsageFilter), ("is_deleted",))] == 1
+
+            first.flush()
+            assert first.counts()[(FilterUsage.name(UsageFilter), ("is_deleted",))] == 2
+
+class ExpressionFilter(FilterSet):
+    class Meta:
+        model = Users
+        expression_param = "filter"
+        fields = {
+            "name", "name__in", "id__gt", "id__lte", "is_deleted", "address__name"
+        }
+
+class ExistsExpressionFilter(FilterSet):
+    class Meta:
+        model = Users
+        expression_param = "filter"
+        fields = {"address__id__gt"}
+        strategy = "exists"
+
+class ExpressionTest(TestClient):
+    def _ids(self, params, filter_class=ExpressionFilter):
+        session = Session()
+        data = sorted(i.id for i in filter_class(params=params, queryset=session.query(Users)).qs.all())
+        session.close()
+        return data
+
+    def test_parse(self):
+        node = parse('name=a b,id__gt=3|!(name__in=["x,y", "z"])')
+        assert node.op == "or"
+        assert node.children[0].op == "and"
+        assert [(i.key, i.values) for i in node.leaves()] == [
+            ("name", ["a b"]), ("id__gt", ["3"]), ("name__in", ["x,y", "z"])
+        ]
+        assert node.children[1].op == "not"
+        assert parse("name=a").op == "and"
+
+        for text in ("(name=a", "name=a|", "name=", "=a", "name=a)", '"a"', "!", "name=[1,2"):
+            with self.assertRaises(ExpressionError):
+                parse(text)
+        with self.assertRaises(ExpressionError):
+            parse("|".join(["id__gt=1"] * 33))
+        with self.assertRaises(ExpressionError):
+            parse("(" * 9 + "id__gt=1" + ")" * 9)
+
+    def test_or(self):
+        assert self._ids({"filter":"name=Indranil-1|id__gt=8"}) == [1, 9, 10]
+        assert self._ids({"filter":'name__in=["Indranil-1","Indranil-2"]|id__gt=9'}) == [1, 2, 10]
+
+    def test_not(self):
+        assert self._ids({"filter":"!id__gt=3"}) == [1, 2, 3]
+        assert self._ids({"filter":"!(id__gt=3,id__lte=8)"}) == [1, 2, 3, 9, 10]
+
+    def test_combined_with_params(self):
+        assert self._ids({"is_deleted":"0", "filter":"id__gt=6|name=Indranil-5"}) == [5, 7]
+        assert self._ids({"filter":["id__gt=5", "id__lte=7"]}) == [6, 7]
+
+    def test_join_leaf(self):
+        assert self._ids({"filter":"address__name=Kolkata|name=Indranil-1"}) == [1, 9]
+
+    def test_errors(self):
+        with self.assertRaises(FilterValidationError) as e:
+            self._ids({"filter":"(name=a"})
+        assert e.exception.errors == [{"filter":"Missing ')'"}]
+
+        with self.assertRaises(FilterValidationError) as e:
+            self._ids({"filter":"age=1|name=a"})
+        assert e.exception.errors == [{"filter":"'age' is not a filter field"}]
+
+        with self.assertRaises(FilterValidationError) as e:
+            with warnings.catch_warnings():
+                warnings.simplefilter("error")
+                self._ids({"filter":"id__gt=abc"})
+        assert "id__gt" in e.exception.errors[0]
+
+        for params in [{"filter":"address__id__gt=abc"}, {"address__id__gt":"abc"}]:
+            with self.assertRaises(FilterValidationError) as e:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("error")
+                    self._ids(params, ExistsExpressionFilter)
+            assert "address__id__gt" in e.exception.errors[0]
+
+        with self.assertRaises(FilterValidationError) as e:
+            self._ids({"filter":'name="\\q"'})
+        assert e.exception.errors[0]["filter"].startswith("Invalid string")
+
+    def test_not_run(self):
+        assert parse("!!name=a").children[0].key == "name"
+        assert parse("!!!name=a").op == "not"
+        assert self._ids({"filter":"!" * 2000 + "id__gt=3"}) == list(range(4, 11))
+
+    def test_disabled_by_default(self):
+        assert len(self._ids({"filter":"name=Indranil-1"}, UserFilter)) == 10
+
+class OrderingFilter(FilterSet):
+    class Meta:
+        model = Users
+        fields = {"is_deleted", "address__name"}
+        ordering_fields = {"id", "name", "age"}
+
+class AddressOrderingFilter(FilterSet):
+    class Meta:
+        model = Address
+        fields = {"user__name"}
+        ordering_fields = {"name", "user__name", "user__age"}
+
+class DefaultOrderingFilter(FilterSet):
+    class Meta:
+        model = Users
+        fields = {"is_deleted"}
+        ordering = "-id"
+
+class OrderingTest(TestClient):
+    def _qs(self, params, filter_class=OrderingFilter):
+        session = Session()
+        query = filter_class(params=params, queryset=session.query(filter_class.Meta.model)).qs
+        return session, query
+
+    def test_parse(self):
+        assert parse_ordering(["-name, address__name", "name"]) == [("name", True), ("address__name", False)]
+        assert parse_ordering("-id") == [("id", True)]
+
+    def test_descending(self):
+        session, query = self._qs("?ordering=-id")
+        assert [i.id for i in query.all()] == list(range(10, 0, -1))
+        assert str(query.statement).endswith("ORDER BY users.id DESC")
+        session.close()
+
+    def test_primary_key_tie_breaker(self):
+        session, query = self._qs("?ordering=name")
+        assert str(query.statement).endswith("ORDER BY users.name ASC, users.id")
+        assert [i.name for i in query.all()][:3] == ["Indranil-1", "Indranil-10", "Indranil-2"]
+        session.close()
+
+    def test_relationship_path_reuses_filter_join(self):
+        session, query = self._qs("?user__name=Indranil-9&ordering=-user__age,name", AddressOrderingFilter)
+        sql = str(query.statement)
+        assert sql.count("JOIN users") == 1
+        assert "ORDER BY users.age DESC, address.name ASC, address.id" in sql
+        assert [i.id for i in query.all()] == [5, 1]
+        session.close()
+
+    def test_to_many_path(self):
+        # one row per address would repeat users in the count and the pages
+        meta = type("Meta", (), {"model":Users, "fields":{"name"}, "ordering_fields":{"address__name"}})
+        with self.assertRaises(FilterFieldError) as e:
+            type("ToManyOrderingFilter", (FilterSet,), {"Meta":meta})
+        assert "to-many" in str(e.exception)
+
+    def test_qs_twice(self):
+        session = Session()
+        filter_set = AddressOrderingFilter(params="?ordering=user__name", queryset=session.query(Address))
+        first = str(filter_set.qs.statement)
+        assert str(filter_set.qs.statement) == first
+        assert first.count("JOIN users") == 1
+        assert len(filter_set.all()) == len(filter_set.all())
+        session.close()
+
+    def test_index_warning(self):
+        OrderingFilter._ordering_warned.clear()
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            self._qs("?ordering=age")[0].close()
+            self._qs("?ordering=age")[0].close()
+            self._qs("?ordering=-id")[0].close()
+        messages = [str(i.message) for i in caught if i.category is OrderingIndexWarning]
+        assert messages == ["OrderingFilter: no index supports ordering by age"]
+        assert [i.filename for i in caught] == [__file__]
+
+        # reached through all(), still reported at the caller
+        OrderingFilter._ordering_warned.clear()
+        session = Session()
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            OrderingFilter(params="?ordering=age", queryset=select(Users), session=session).all()
+        assert [i.filename for i in caught] == [__file__]
+        session.close()
+
+    def test_invalid_field(self):
+        with self.assertRaises(FilterValidationError) as e:
+            self._qs("?ordering=-is_deleted,foo")
+        assert e.exception.errors == [
+            {"ordering":"'is_deleted' is not an ordering field"},
+            {"ordering":"'foo' is not an ordering field"},
+        ]
+
+    def test_default_ordering(self):
+        session, query = self._qs("", DefaultOrderingFilter)
+        assert [i.id for i in query.all()][:2] == [10, 9]
+        session.close()
+
+        session, query = self._qs("?ordering=name", UserFilter)
+        assert "ORDER BY" not in str(query.statement)
+        session.close()
+
+    def test_pagination_is_deterministic(self):
+        session = Session()
+        query = session.query(Users)
+        assert str(ordered(query).statement).endswith("ORDER BY users.id")
+        query = query.order_by(Users.name)
+        assert ordered(query) is query
+
+        # ORDER BY outside the select list is rejected with GROUP BY / DISTINCT
+        for query in [
+            session.query(Users.name, func.count()).group_by(Users.name),
+            session.query(Users.name).distinct(),
+            session.query(Users.name),
+        ]:
+            assert "ORDER BY" not in str(ordered(query).statement)
+        assert str(ordered(session.query(Users.id, Users.name)).statement).endswith("ORDER BY users.id")
+        data = PageNoPagination(params={"limit":3}, queryset=session.query(Users.is_deleted).distinct()).main()
+        assert sorted(data["results"]) == [(False,), (True,)]
+        data = PageNoPagination(params={"limit":3, "page":2}, queryset=session.query(Users)).main()
+        assert [i.id for i in data["results"]] == [4, 5, 6]
+        session.close()
+
+class SelectStatementTest(TestClient):
+    def test_select(self):
+        session = Session()
+        filter_set = UserFilter(params="?address__name=Kolkata&id__gt=3", queryset=select(Users), session=session)
+        assert [i.id for i in filter_set.all()] == [9]
+        assert filter_set.first().id == 9
+        assert [i.id for i in filter_set.scalars()] == [9]
+        assert "JOIN address" in str(filter_set.qs)
+        session.close()
+
+    def test_query_uses_its_own_session(self):
+        session = Session()
+        filter_set = UserFilter(params="?id__lt=3", queryset=session.query(Users))
+        assert [i.id for i in filter_set.all()] == [1, 2]
+        session.close()
+
+    def test_select_without_session(self):
+        with self.assertRaises(ValueError):
+            UserFilter(params="?id__lt=3", queryset=select(Users)).all()
+
+class ProjectionFilter(FilterSet):
+    class Meta:
+        model = Users
+        fields = {"id__lte"}
+        projection_fields = {"id", "name", "age"}
+        deferred = {"age"}
+
+class ProjectionSerializer(serializers.Serializer):
+    name:Optional[str] = None
+    age:Optional[int] = None
+
+    class Meta:
+        models = Users
+
+    class Config:
+        from_attributes = True
+
+class ProjectionTest(TestClient):
+    def test_load_only(self):
+        session = Session()
+        query = ProjectionFilter(params="?id__lte=2&fields=name", queryset=session.query(Users)).qs
+        assert str(query.statement).startswith("SELECT users.id, users.name \nFROM users")
+        data = query.all()
+        assert [i.name for i in data] == ["Indranil-1", "Indranil-2"]
+        assert {"age", "is_deleted"} <= inspect(data[0]).unloaded
+
+        query = ProjectionFilter(params="?fields=age,name", queryset=select(Users)).qs
+        assert "users.age" in str(query) and "users.is_deleted" not in str(query)
+        session.close()
+
+    def test_deferred_by_default(self):
+        session = Session()
+        query = ProjectionFilter(params="?id__lte=2", queryset=session.query(Users)).qs
+        assert "users.age" not in str(query.statement)
+        assert "users.is_deleted" in str(query.statement)
+        session.close()
+
+    def test_invalid_field(self):
+        with self.assertRaises(FilterValidationError) as e:
+            ProjectionFilter(params="?fields=name,is_deleted", queryset=select(Users)).qs
+        assert e.exception.errors == [{"fields":"'is_deleted' is not a selectable field"}]
+
+        with self.assertRaises(FilterFieldError):
+            class InvalidProjection(FilterSet):
+                class Meta:
+                    model = Users
+                    fields = {}
+                    projection_fields = {"address"}
+
+    def test_serializer_reads_loaded_columns(self):
+        session = Session()
+        query = ProjectionFilter(params="?id__lte=3&fields=name", queryset=session.query(Users)).qs
+        data = PageNoPagination(params={"limit":2}, queryset=query).main()
+        session.expunge_all()
+        srz_data = serializers.ListPaginationSerializer(ProjectionSerializer)(**data).model_dump()
+        assert srz_data["results"] == [
+            {"id":1, "name":"Indranil-1", "age":None}, {"id":2, "name":"Indranil-2", "age":None}
+        ]
+        session.close()
+
+class PrefetchFilter(FilterSet):
+    class Meta:
+        model = Users
+        fields = {"id__lte", "address__name"}
+        prefetch = {"address"}
+        includes = {"contact":"joined", "contact__contact_detail":"subquery"}
+
+class AddressPrefetchFilter(FilterSet):
+    class Meta:
+        model = Address
+        fields = {"user__name"}
+        prefetch = {"user":"joined"}
+
+class PrefetchTest(TestClient):
+    def _statements(self, session, run):
+        statements = []
+        engine = session.get_bind()
+        def listener(conn, cursor, statement, *args):
+            statements.append(statement)
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            run()
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+        return statements
+
+    def test_prefetch(self):
+        session = Session()
+        def run():
+            query = PrefetchFilter(params="?id__lte=4", queryset=session.query(Users)).qs
+            data = PageNoPagination(params={"limit":3}, queryset=query).main()
+            assert [len(i.address) >= 0 for i in data["results"]] == [True] * 3
+        # count, page, one selectin for every address on the page
+        assert len(self._statements(session, run)) == 3
+        session.close()
+
+    def test_cached_prefetch(self):
+        session = Session()
+        cache = ResultCache(ttl=60)
+        params = "?id__lte=9&include=contact__contact_detail"
+        def page():
+            query = PrefetchFilter(params=params, queryset=session.query(Users)).qs
+            return PageNoPagination(params={"limit":10}, queryset=query, cache=cache).main()["results"]
+
+        data = page()
+        expected = [
+            (len(i.address), [len(j.contact_detail) for j in i.contact]) for i in data
+        ]
+        session.expunge_all()
+        cached = page()
+        assert cache.hits == 1
+        assert [(len(i.address), [len(j.contact_detail) for j in i.contact]) for i in cached] == expected
+        assert cached[8].address[0].name in ("Kolkata", "Indore")
+
+        assert cache.backend._tables.keys() >= {"users", "address", "contact", "contact_detail"}
+        cache.invalidate("contact_detail")
+        page()
+        assert cache.misses == 2
+
+        # same SQL, the loader option alone has to tell the entries apart
+        query = session.query(Users).filter(Users.id == 9)
+        PageNoPagination(params={"limit":3}, queryset=query, cache=cache).main()
+        session.expunge_all()
+        query = query.options(selectinload(Users.address))
+        data = PageNoPagination(params={"limit":3}, queryset=query, cache=cache).main()["results"]
+        assert cache.misses == 4
+        session.expunge_all()
+        assert {i.name for i in data[0].address} == {"Kolkata", "Indore"}
+        cache.close()
+        session.close()
+
+    def test_include(self):
+        session = Session()
+        def run():
+            data = PrefetchFilter(
+                params="?id__lte=4&include=contact__contact_detail,contact", queryset=select(Users), session=session
+            ).all()
+            [[j.contact_detail for j in i.contact] for i in data]
+        statements = self._statements(session, run)
+        assert len(statements) == 3
+        assert "LEFT OUTER JOIN contact" in statements[0]
+        session.close()
+
+    def test_include_validation(self):
+        with self.assertRaises(FilterValidationError) as e:
+            PrefetchFilter(params="?include=address__user", queryset=select(Users)).qs
+        assert e.exception.errors == [{"include":"'address__user' is not an includable relation"}]
+
+        with self.assertRaises(FilterFieldError):
+            class InvalidPrefetch(FilterSet):
+                class Meta:
+                    model = Users
+                    fields = {}
+                    prefetch = {"address":"lazy"}
+
+    def test_reuses_filter_join(self):
+        session = Session()
+        def run():
+            data = AddressPrefetchFilter(params="?user__name=Indranil-9", queryset=session.query(Address)).all()
+            assert {i.user.name for i in data} == {"Indranil-9"}
+        statements = self._statements(session, run)
+        assert len(statements) == 1
+        assert statements[0].count("JOIN users") == 1
+
+        def run():
+            data = AddressPrefetchFilter(params="", queryset=session.query(Address)).all()
+            [i.user for i in data]
+        statements = self._statements(session, run)
+        assert len(statements) == 1 and "LEFT OUTER JOIN users AS users_1" in statements[0]
+        session.close()
+
+class BatchTest(TestClient):
+    def test_batch(self):
+        session = Session()
+        statements = []
+        def listener(conn, cursor, statement, *args):
+            statements.append(statement)
+        event.listen(session.get_bind(), "before_cursor_execute", listener)
+
+        data = batch(session, [
+            (UserFilter, "?id__gt=7"),
+            (UserFilter, "?address__name=Kolkata"),
+            (OrderingFilter, "?ordering=-id"),
+            (UserFilter, "?name=nobody"),
+        ])
+        event.remove(session.get_bind(), "before_cursor_execute", listener)
+
+        assert len(statements) == 1 and "UNION ALL" in statements[0]
+        assert [[i.id for i in rows] for rows in data] == [
+            [8, 9, 10], [9], list(range(10, 0, -1)), []
+        ]
+        assert data[0][0] is data[2][2]
+        session.close()
+
+    def test_batch_per_model_and_limit(self):
+        session = Session()
+        data = batch(session, {
+            "users":(OrderingFilter, "?ordering=-id"),
+            "address":(AddressFilter, "?user__name=Indranil-9"),
+        }, limit=2)
+        assert [i.id for i in data["users"]] == [10, 9]
+        assert {i.user_id for i in data["address"]} == {9}
+        session.close()
+
+    def test_batch_loads(self):
+        session = Session()
+        data = batch(session, [
+            (PrefetchFilter, "?id__lte=2&include=contact"),
+            (UserFilter, "?id__gt=8"),
+        ])
+        session.expunge_all()
+        assert [[i.id for i in rows] for rows in data] == [[1, 2], [9, 10]]
+        assert all({"address", "contact"} <= i.__dict__.keys() for i in data[0])
+        assert not any({"address", "contact"} & i.__dict__.keys() for i in data[1])
+        session.close()
+
+        session = Session()
+        data = batch(session, [(ProjectionFilter, "?id__lte=2&fields=name")])
+        assert [i.name for i in data[0]] == ["Indranil-1", "Indranil-2"]
+        assert "age" not in data[0][0].__dict__
+        session.close()
+
+class ParityMeta:
+    model = Users
+    expression_param = "filter"
+    fields = {
+        "name", "name__in", "id__gt", "id__lte", "id__ne", "id__not_in",
+        "is_deleted", "name__icontains", "name__like", "name__startswith",
+        "name__is", "address__name", "contact__contact_detail__id",
+    }
+    ordering_fields = {"id", "name"}
+
+class SqlParityFilter(FilterSet):
+    Meta = ParityMeta
+
+class MemoryParityFilter(MemoryFilterSet):
+    Meta = ParityMeta
+
+class MemoryFilterTest(TestClient):
+    def setUp(self):
+        self.snapshot = Snapshot.for_filterset(MemoryParityFilter, Session)
+
+    def test_parity_with_sql(self):
+        session = Session()
+        for params in (
+            "", "?name=Indranil-1", "?name__in=['Indranil-1','Indranil-3']",
+            "?id__gt=3&id__lte=6", "?id__ne=2&id__not_in=[3,4]", "?is_deleted=0",
+            "?name__icontains=RANIL-1", "?name__like=Indranil-_", "?name__startswith=Indranil-1",
+            "?name__is=null", "?address__name=Kolkata", "?address__name=Kolkata&address__name=Indore",
+            "?contact__contact_detail__id=15", "?filter=(name=Indranil-1|id__gt=8),!is_deleted=1",
+            "?ordering=-name", "?is_deleted=1&ordering=-id",
+        ):
+            expected = [i.id for i in SqlParityFilter(params=params, queryset=session.query(Users)).qs.all()]
+            data = [i.id for i in MemoryParityFilter(params=params, queryset=self.snapshot).qs.all()]
+            if "ordering" not in params:
+                expected, data = sorted(expected), sorted(data)
+            assert data == expected, params
+        session.close()
+
+    def test_path_negation_and_errors(self):
+        data = MemoryParityFilter(params="?filter=!address__name=Kolkata", queryset=self.snapshot).all()
+        assert 9 not in [i.id for i in data] and len(data) == 9
+
+        with self.assertRaises(FilterValidationError):
+            MemoryParityFilter(params="?id__gt=abc", queryset=self.snapshot).qs
+        with self.assertRaises(FilterFieldError):
+            class SearchMemoryFilter(MemoryFilterSet):
+                class Meta:
+                    model = Users
+                    fields = {"name__search"}
+
+    def test_range_index(self):
+        values = [3, None, 1, 3, 2.5, None, 7]
+        store = Store([SimpleNamespace(v=i) for i in values], {"v"})
+        field = SimpleNamespace(relation_path=(), name="v")
+        tests = {
+            "lt":lambda a, b: a < b, "lte":lambda a, b: a <= b,
+            "gt":lambda a, b: a > b, "gte":lambda a, b: a >= b,
+        }
+        for op, test in tests.items():
+            for value in (0, 1, 2.5, 3, 4, 8):
+                expected = [int(i is not None and test(i, value)) for i in values]
+                assert list(store.predicate(Predicate(field, op, (value,)))) == expected, (op, value)
+        assert list(store.predicate(Predicate(field, "in", [3, 7], negate=True))) == [0, 0, 1, 0, 1, 0, 0]
+
+    def test_refresh_on_change(self):
+        snapshot = Snapshot.for_filterset(MemoryParityFilter, Session, watch=True)
+        assert len(MemoryParityFilter(params="?name=Indranil-11", queryset=snapshot).all()) == 0
+
+        session = Session()
+        status, user = Users(name="Indranil-11", age=30).create(session)
+        assert status and snapshot.stale
+        try:
+            assert [i.name for i in MemoryParityFilter(params="?name=Indranil-11", queryset=snapshot).all()] == ["Indranil-11"]
+        finally:
+            user.delete(session)
+            snapshot.close()
+        assert snapshot.stale
+        assert len(MemoryParityFilter(params="?name=Indranil-11", queryset=snapshot).all()) == 0
+
 class FilterTest(TestClient):
     proxy = ProxyRequest
     user_filter_class = UserFilter
@@ -591,6 +1878,287 @@ class LimitOffSetPaginationTest(TestClient):
         assert len(data["results"]) == 0
         session.close()
 
+class CursorPaginationTest(TestClient):
+    def walk(self, query, limit, secret_key="secret"):
+        pages, params = [], {"limit":limit}
+        while True:
+            data = CursorPagination(params=params, queryset=query, secret_key=secret_key).main()
+            pages.append(data)
+            if not data["pagination"]["next"]:
+                return pages
+            params = {"limit":limit, "cursor":data["pagination"]["next"]}
+
+    def test_forward_backward(self):
+        session = Session()
+        query = session.query(Users)
+        pages = self.walk(query, 3)
+        assert [[i.id for i in page["results"]] for page in pages] == [[1, 2, 3], [4, 5, 6], [7, 8, 9], [10]]
+        assert pages[0]["pagination"]["previous"] is None
+        assert pages[-1]["pagination"]["limit"] == 3
+
+        params = {"limit":3, "cursor":pages[-1]["pagination"]["previous"]}
+        data = CursorPagination(params=params, queryset=query, secret_key="secret").main()
+        assert [i.id for i in data["results"]] == [7, 8, 9]
+        assert data["pagination"]["next"] and data["pagination"]["previous"]
+
+        params = {"limit":3, "cursor":pages[1]["pagination"]["previous"]}
+        data = CursorPagination(params=params, queryset=query, secret_key="secret").main()
+        assert [i.id for i in data["results"]] == [1, 2, 3]
+        assert data["pagination"]["previous"] is None
+        session.close()
+
+    def test_compound_ordering(self):
+        session = Session()
+        query = session.query(Users).order_by(Users.is_deleted, Users.name.desc())
+        expected = [i.id for i in query.all()]
+        pages = self.walk(query, 4)
+        assert [i.id for page in pages for i in page["results"]] == expected
+
+        params = {"limit":4, "cursor":pages[-1]["pagination"]["previous"]}
+        data = CursorPagination(params=params, queryset=query, secret_key="secret").main()
+        assert [i.id for i in data["results"]] == expected[4:8]
+
+        query = UserFilter(params={"id__gt":"2"}, queryset=session.query(Users)).qs
+        assert [i.id for page in self.walk(query, 5) for i in page["results"]] == list(range(3, 11))
+        session.close()
+
+    def test_column_query(self):
+        session = Session()
+        query = session.query(Users.id, Users.name).order_by(Users.name.desc())
+        data = CursorPagination(params={"limit":2}, queryset=query, secret_key="secret").main()
+        assert data["results"] == [(9, "Indranil-9"), (8, "Indranil-8")]
+        params = {"limit":2, "cursor":data["pagination"]["next"]}
+        data = CursorPagination(params=params, queryset=query, secret_key="secret").main()
+        assert data["results"] == [(7, "Indranil-7"), (6, "Indranil-6")]
+        session.close()
+
+    def test_nullable_ordering(self):
+        session = Session()
+        session.query(Users).filter(Users.id.in_([2, 5, 8])).update({"age":None})
+        try:
+            # NULL sorts last ascending and first descending
+            query = session.query(Users).order_by(Users.age)
+            pages = self.walk(query, 2)
+            assert [i.id for page in pages for i in page["results"]] == [9, 6, 3, 7, 10, 4, 1, 2, 5, 8]
+
+            params = {"limit":2, "cursor":pages[-1]["pagination"]["previous"]}
+            data = CursorPagination(params=params, queryset=query, secret_key="secret").main()
+            assert [i.id for i in data["results"]] == [1, 2]
+
+            query = session.query(Users).order_by(Users.age.desc())
+            pages = self.walk(query, 4)
+            assert [i.id for page in pages for i in page["results"]] == [2, 5, 8, 1, 4, 10, 3, 7, 6, 9]
+
+            params = {"limit":4, "cursor":pages[1]["pagination"]["previous"]}
+            data = CursorPagination(params=params, queryset=query, secret_key="secret").main()
+            assert [i.id for i in data["results"]] == [2, 5, 8, 1]
+        finally:
+            session.rollback()
+            session.close()
+
+    def test_tampered_cursor(self):
+        session = Session()
+        query = session.query(Users)
+        cursor = CursorPagination(params={"limit":2}, queryset=query, secret_key="secret").main()["pagination"]["next"]
+        for params in [
+            {"limit":2, "cursor":cursor[:-2] + "AA"},
+            {"limit":2, "cursor":"not-a-cursor"},
+        ]:
+            with self.assertRaises(CursorError):
+                CursorPagination(params=params, queryset=query, secret_key="secret").main()
+        with self.assertRaises(CursorError):
+            CursorPagination(params={"limit":2, "cursor":cursor}, queryset=query, secret_key="other").main()
+        session.close()
+
+    def test_no_limit_and_serializer(self):
+        session = Session()
+        query = session.query(Users)
+        assert len(CursorPagination(params={}, queryset=query).main()["results"]) == 10
+
+        data = CursorPagination(params={"limit":2}, queryset=query).main()
+        srz_data = serializers.ListPaginationSerializer(ProjectionSerializer)(**data).model_dump()
+        assert [i["name"] for i in srz_data["results"]] == ["Indranil-1", "Indranil-2"]
+        assert srz_data["pagination"]["next"] == data["pagination"]["next"]
+        session.close()
+
+class CountStrategyTest(TestClient):
+    def test_exact(self):
+        session = Session()
+        query = session.query(Users)
+        data = PageNoPagination(params={"limit":3, "page":2}, queryset=query, count_strategy="exact").main()
+        assert data["pagination"] == {
+            "count":10, "count_strategy":"exact", "total_pages":4, "next_page":3, "previous_page":1
+        }
+        session.close()
+
+    def test_none(self):
+        session = Session()
+        query = session.query(Users)
+        data = PageNoPagination(params={"limit":3}, queryset=query, count_strategy="none").main()
+        assert [i.id for i in data["results"]] == [1, 2, 3]
+        assert data["pagination"] == {
+            "count":None, "count_strategy":"none", "total_pages":None, "next_page":2, "previous_page":None
+        }
+
+        data = PageNoPagination(params={"limit":3, "page":4}, queryset=query, count_strategy="none").main()
+        assert [i.id for i in data["results"]] == [10]
+        assert data["pagination"]["next_page"] is None and data["pagination"]["previous_page"] == 3
+
+        data = PageNoPagination(params={"limit":5, "page":3}, queryset=query, count_strategy="none").main()
+        assert data["results"] == [] and data["pagination"]["next_page"] is None
+
+        data = LimitOffSetPagination(params={"limit":4, "offset":4}, queryset=query, count_strategy="none").main()
+        assert [i.id for i in data["results"]] == [5, 6, 7, 8]
+        assert data["pagination"]["next_offset"] == 8 and data["pagination"]["previous_offset"] is None
+
+        data = LimitOffSetPagination(params={"limit":4, "offset":8}, queryset=query, count_strategy="none").main()
+        assert [i.id for i in data["results"]] == [9, 10]
+        assert data["pagination"]["next_offset"] is None and data["pagination"]["previous_offset"] == 4
+        session.close()
+
+    def test_cached(self):
+        session = Session()
+        counts = []
+        listener = lambda conn, cursor, statement, *args: counts.append(statement) if "count(" in statement else None
+        event.listen(session.get_bind(), "before_cursor_execute", listener)
+        strategy = CachedCount(ttl=60)
+        try:
+            for params in [{"limit":3}, {"limit":3, "page":2}]:
+                query = UserFilter(params={"id__gt":"4"}, queryset=session.query(Users)).qs
+                data = PageNoPagination(params=params, queryset=query, count_strategy=strategy).main()
+                assert data["pagination"]["count"] == 6
+                assert data["pagination"]["count_strategy"] == "cached"
+            assert len(counts) == 1
+
+            query = UserFilter(params={"id__gt":"8"}, queryset=session.query(Users)).qs
+            assert PageNoPagination(params={"limit":3}, queryset=query, count_strategy=strategy).main()["pagination"]["count"] == 2
+            assert len(counts) == 2
+        finally:
+            event.remove(session.get_bind(), "before_cursor_execute", listener)
+            strategy.close()
+            session.close()
+
+    def test_estimated(self):
+        # a private database, ANALYZE would change the plans other tests check
+        engine = create_engine("sqlite://")
+        Users.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        session.add_all([Users(name=f"user-{i}") for i in range(25)])
+        session.commit()
+
+        query = session.query(Users)
+        data = PageNoPagination(params={"limit":10}, queryset=query, count_strategy="estimated").main()
+        assert data["pagination"]["count_strategy"] == "exact"
+        assert data["pagination"]["count"] == 25
+
+        session.execute(text("ANALYZE"))
+        session.add(Users(name="user-25"))
+        session.commit()
+
+        data = PageNoPagination(params={"limit":10, "page":3}, queryset=query, count_strategy=EstimatedCount()).main()
+        assert data["pagination"]["count_strategy"] == "estimated"
+        assert data["pagination"]["count"] == 25
+        assert data["pagination"]["total_pages"] == 3
+        assert len(data["results"]) == 6 and data["pagination"]["next_page"] is None
+
+        query = session.query(Users).filter(Users.name == "user-1")
+        data = LimitOffSetPagination(params={"limit":10}, queryset=query, count_strategy="estimated").main()
+        assert data["pagination"]["count_strategy"] == "exact"
+        assert data["pagination"]["count"] == 1
+        session.close()
+
+    def test_postgresql_estimate(self):
+        strategy = EstimatedCount()
+        statement = UserFilter(params={"id__gt":"4"}, queryset=select(Users)).qs
+        steps = strategy._estimate(statement, postgresql.dialect())
+        explain = str(next(steps).compile(dialect=postgresql.dialect()))
+        assert explain.startswith("EXPLAIN (FORMAT JSON) SELECT")
+
+        steps = strategy._estimate(select(Users), postgresql.dialect())
+        assert "reltuples" in str(next(steps))
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            PageNoPagination(params={}, queryset=None, count_strategy="guess")
+
+class WindowCountTest(TestClient):
+    def statements(self, session, pagination):
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(session.get_bind(), "before_cursor_execute", listener)
+        try:
+            return pagination.main(), statements
+        finally:
+            event.remove(session.get_bind(), "before_cursor_execute", listener)
+
+    def test_single_query(self):
+        session = Session()
+        query = UserFilter(params={"id__gt":"2"}, queryset=session.query(Users)).qs
+        expected = PageNoPagination(params={"limit":3, "page":2}, queryset=query).main()
+        data, statements = self.statements(
+            session, PageNoPagination(params={"limit":3, "page":2}, queryset=query, count_strategy="window")
+        )
+        assert len(statements) == 1 and "OVER ()" in statements[0]
+        assert [i.id for i in data["results"]] == [i.id for i in expected["results"]] == [6, 7, 8]
+        assert data["pagination"] == {**expected["pagination"], "count_strategy":"window"}
+
+        data, statements = self.statements(
+            session, LimitOffSetPagination(params={"limit":4, "offset":4}, queryset=session.query(Users), count_strategy="window")
+        )
+        assert len(statements) == 1
+        assert [i.id for i in data["results"]] == [5, 6, 7, 8]
+        assert data["pagination"] == {
+            "count":10, "count_strategy":"window", "total_pages":3, "next_offset":8, "previous_offset":None
+        }
+        session.close()
+
+    def test_column_query(self):
+        session = Session()
+        query = session.query(Users.id, Users.name)
+        for pagination_class, params in [(PageNoPagination, {"limit":2}), (LimitOffSetPagination, {"limit":2})]:
+            expected = pagination_class(params=params, queryset=query).main()["results"]
+            data = pagination_class(params=params, queryset=query, count_strategy="window").main()["results"]
+            assert data == expected == [(1, "Indranil-1"), (2, "Indranil-2")]
+        session.close()
+
+    def test_out_of_range_fallback(self):
+        session = Session()
+        query = session.query(Users)
+        data, statements = self.statements(
+            session, PageNoPagination(params={"limit":3, "page":9}, queryset=query, count_strategy="window")
+        )
+        assert len(statements) == 2
+        assert data["results"] == []
+        assert data["pagination"] == {
+            "count":10, "count_strategy":"exact", "total_pages":4, "next_page":None, "previous_page":4
+        }
+
+        data = LimitOffSetPagination(params={"limit":4, "offset":30}, queryset=query, count_strategy="window").main()
+        assert data["results"] == []
+        assert data["pagination"]["previous_offset"] == 10 and data["pagination"]["count_strategy"] == "exact"
+
+        query = UserFilter(params={"name":"nobody"}, queryset=session.query(Users)).qs
+        data = PageNoPagination(params={"limit":3}, queryset=query, count_strategy="window").main()
+        assert data["results"] == [] and data["pagination"]["count"] == 0
+        session.close()
+
+    def test_supported(self):
+        session = Session()
+        query = session.query(Users)
+        assert WindowCount.supported(postgresql.dialect(), query)
+        assert not WindowCount.supported(postgresql.dialect(), query.distinct())
+
+        dialect = mysql.dialect()
+        dialect.server_version_info = (5, 7, 30)
+        assert not WindowCount.supported(dialect, query)
+        dialect.server_version_info = (8, 0, 30)
+        assert WindowCount.supported(dialect, query)
+
+        # DISTINCT and old servers use the separate count
+        data = PageNoPagination(params={"limit":3}, queryset=query.distinct(), count_strategy="window").main()
+        assert data["pagination"]["count_strategy"] == "exact"
+        session.close()
+
 if __name__=="__main__":
     FilterTest().main()
     PageNoPaginationTest().main()
@@ -5,6 +5,9 @@ setup(
     version='0.1',
     packages=find_packages(),
     install_requires=["sqlalchemy", "pydantic", "aiosqlite"],
+    entry_points={
+        "console_scripts": ["bjs-index-advisor=bjs_sqlalchemy.filters.advisor:main"],
+    },
     description='Sqlalchemy Filter package will help you to filtering your data on sqlalchemy query.',
     long_description=open('README.md').read(),
     long_description_content_type='text/markdown',